@@ -1,71 +1,116 @@
-import dateutil.parser
-import babel
 import logging
-
-from datetime import datetime
-from db import db
-from flask import Flask, render_template
-from flask_migrate import Migrate
-from flask_moment import Moment
-from logging import Formatter, FileHandler
-from forms import *
-
-from services import artist, home, show, venue
+import os
+
+import click
+import config
+from db import db, engine_options
+from flask import Flask, current_app, render_template
+from logging import Formatter, FileHandler, StreamHandler
+from werkzeug.local import LocalProxy
+from werkzeug.utils import import_string
+from replicas import replicas
+from search import search
+from geo import geo
+from stats import show_stats
+import formatting
+import templating
+from assets import assets
+from cache import cache
+from instrumentation import instrumentation
+from explain import explain_check_command
+from catalog import catalog_cli
+from idempotency import idempotency_cli
 
 #----------------------------------------------------------------------------#
 # App Config.
+#
+# Only what every process needs is imported up front. The blueprints (and
+# the forms they import) are imported by create_app, and not at all with
+# REGISTER_BLUEPRINTS off; Flask-Migrate only for the flask command, and
+# Flask-Moment only once a template uses `moment`.
 #----------------------------------------------------------------------------#
 
-moment = Moment()
-migrate = Migrate()
+# (module, app-level rule and endpoint aliasing its index page)
+BLUEPRINTS = [
+    ('services.home', '/', 'index'),
+    ('services.artist', '/artists', 'artists'),
+    ('services.show', '/shows', 'shows'),
+    ('services.venue', '/venues', 'venues'),
+    ('services.api', None, None),
+]
 
-#----------------------------------------------------------------------------#
-# Filters.
-#----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):
-    date = dateutil.parser.parse(value)
-    if format == 'full':
-            format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == 'medium':
-            format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format, locale='en')
+def moment():
+    # the `moment` template global of Flask-Moment
+    if 'moment' not in current_app.extensions:
+        from flask_moment import _moment
+        current_app.extensions['moment'] = _moment
+    return current_app.extensions['moment']
 
 
+def init_migrate(app):
+    # e.g. `flask db upgrade`
+    from flask_migrate import Migrate
+    Migrate(app, db)
+
 #----------------------------------------------------------------------------#
 # Launch.
 #----------------------------------------------------------------------------#
 
-def create_app():
+def create_app(overrides=None, profile=None):
+    profile = profile or os.environ.get('FYYUR_CONFIG', 'development')
+    if profile not in config.PROFILES:
+        raise RuntimeError('Unknown FYYUR_CONFIG {!r}, expected one of: {}'.format(
+            profile, ', '.join(config.PROFILES)))
+
     app = Flask(__name__)
     app.config.from_object('config')
-
-    moment.init_app(app)
+    app.config.from_object(config.PROFILES[profile])
+    if overrides is not None:
+        # e.g. benchmarks pointing the app at their own database
+        app.config.update(overrides)
+    if not app.config['SECRET_KEY']:
+        raise RuntimeError('SECRET_KEY must be set, and be the same for every worker.')
+    # an explicit SQLALCHEMY_ENGINE_OPTIONS wins over the DB_POOL_* settings
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
+
+    app.jinja_env.globals['moment'] = LocalProxy(moment)
+    replicas.init_app(app)
     db.init_app(app)
-    migrate.init_app(app, db)
-
-    app.jinja_env.filters['datetime'] = format_datetime
+    if click.get_current_context(silent=True) is not None:
+        init_migrate(app)
+    search.init_app(app)
+    geo.init_app(app)
+    cache.init_app(app)
+    instrumentation.init_app(app)
+    show_stats.init_app(app)
 
-    app.register_blueprint(home.bp)
-    app.add_url_rule('/', endpoint='index')
+    formatting.init_app(app)
+    assets.init_app(app)
 
-    app.register_blueprint(artist.bp)
-    app.add_url_rule('/artists', endpoint='artists')
+    app.cli.add_command(explain_check_command)
+    app.cli.add_command(catalog_cli)
+    app.cli.add_command(idempotency_cli)
 
-    app.register_blueprint(show.bp)
-    app.add_url_rule('/shows', endpoint='shows')
+    if app.config['REGISTER_BLUEPRINTS']:
+        for module, rule, endpoint in BLUEPRINTS:
+            app.register_blueprint(import_string(module).bp)
+            if rule is not None:
+                app.add_url_rule(rule, endpoint=endpoint)
 
-    app.register_blueprint(venue.bp)
-    app.add_url_rule('/venues', endpoint='venues')
+    templating.init_app(app)
 
     if not app.debug:
-        file_handler = FileHandler('error.log')
-        file_handler.setFormatter(
+        if app.config['LOG_FILE']:
+            log_handler = FileHandler(app.config['LOG_FILE'])
+        else:
+            log_handler = StreamHandler()
+        log_handler.setFormatter(
                 Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
         )
         app.logger.setLevel(logging.INFO)
-        file_handler.setLevel(logging.INFO)
-        app.logger.addHandler(file_handler)
+        log_handler.setLevel(logging.INFO)
+        app.logger.addHandler(log_handler)
         app.logger.info('errors')
 
     @app.errorhandler(404)
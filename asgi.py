@@ -0,0 +1,185 @@
+import io
+import random
+import sys
+
+from asgiref.wsgi import WsgiToAsgi
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from werkzeug.exceptions import HTTPException
+
+from app import create_app
+from db import session
+from replicas import reads_from_replica
+
+#----------------------------------------------------------------------------#
+# Async serving mode.
+#
+#   uvicorn --factory asgi:create_asgi_app
+#
+# The listing and search routes run on the event loop: each request goes
+# through the usual Flask dispatch (the same views, templates, cache and
+# instrumentation) inside SQLAlchemy's greenlet bridge, with db.session
+# bound to an asyncio engine, so a request waiting on the database yields to
+# the others. Every other route is handed to the WSGI app in a thread.
+#----------------------------------------------------------------------------#
+
+ASYNC_DRIVERS = {
+    'postgresql': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite',
+}
+
+ASYNC_ENDPOINTS = {
+    'artist.artists', 'artist.artists_by_genre', 'artist.search_artists',
+    'venue.venues', 'venue.venues_by_genre', 'venue.search_venues',
+    'show.shows',
+    'api.artists', 'api.venues', 'api.shows',
+}
+
+
+def async_engine(uri, config):
+    # e.g. postgresql://... -> postgresql+asyncpg://...
+    url = make_url(uri)
+    url = url.set(drivername=ASYNC_DRIVERS[url.get_backend_name()])
+    options = dict(config['SQLALCHEMY_ENGINE_OPTIONS'])
+    if 'connect_args' in options and url.get_backend_name() == 'postgresql':
+        # asyncpg takes server settings rather than libpq options
+        options['connect_args'] = {'server_settings': {
+            'statement_timeout': str(config['DB_STATEMENT_TIMEOUT']),
+        }}
+    return create_async_engine(url, **options)
+
+
+def wsgi_environ(scope, body):
+    # the WSGI environ Flask builds its request from
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf8').decode('latin1'),
+        'PATH_INFO': scope['path'].encode('utf8').decode('latin1'),
+        'QUERY_STRING': scope['query_string'].decode('ascii'),
+        'SERVER_PROTOCOL': 'HTTP/{}'.format(scope['http_version']),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    server = scope.get('server') or ('localhost', 80)
+    environ['SERVER_NAME'], environ['SERVER_PORT'] = server[0], str(server[1] or 0)
+    if scope.get('client'):
+        environ['REMOTE_ADDR'], environ['REMOTE_PORT'] = scope['client'][0], str(scope['client'][1])
+
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin1').upper().replace('-', '_')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = 'HTTP_' + name
+        value = value.decode('latin1')
+        if name in environ:
+            value = environ[name] + ',' + value
+        environ[name] = value
+    return environ
+
+
+async def read_body(receive):
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return body
+
+
+class AsyncApp:
+    def __init__(self, app):
+        self.app = app
+        self.wsgi = WsgiToAsgi(app)
+        self.engine = async_engine(app.config['SQLALCHEMY_DATABASE_URI'], app.config)
+        self.replicas = [async_engine(i, app.config) for i in app.config['SQLALCHEMY_REPLICA_URIS']]
+        self.adapter = app.url_map.bind('localhost')
+
+        # built here, with the sync engine, so the first searches do not
+        # wait on it
+        with app.app_context():
+            app.extensions['search'].build()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] == 'http' and self.endpoint(scope) in ASYNC_ENDPOINTS:
+            return await self.dispatch(scope, receive, send)
+        return await self.wsgi(scope, receive, send)
+
+    def endpoint(self, scope):
+        try:
+            return self.adapter.match(scope['path'], method=scope['method'])[0]
+        except HTTPException:
+            return None
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                for engine in [self.engine] + self.replicas:
+                    await engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def dispatch(self, scope, receive, send):
+        environ = wsgi_environ(scope, await read_body(receive))
+        ctx = self.app.request_context(environ)
+        ctx.push()
+        try:
+            engine = self.engine
+            if self.replicas and reads_from_replica():
+                engine = random.choice(self.replicas)
+
+            async with AsyncSession(engine) as db_session:
+                def run(fn):
+                    # db.session is looked up per greenlet, and every
+                    # run_sync call starts a new one
+                    def call(sync_session):
+                        session.registry.set(sync_session)
+                        try:
+                            return fn()
+                        finally:
+                            session.registry.clear()
+                    return db_session.run_sync(call)
+
+                response = await run(self.full_dispatch_request)
+                await send({
+                    'type': 'http.response.start',
+                    'status': response.status_code,
+                    'headers': [(k.lower().encode('latin1'), v.encode('latin1')) for k, v in response.headers.items()],
+                })
+                if not response.is_streamed:
+                    await send({'type': 'http.response.body', 'body': response.get_data()})
+                    return
+
+                # streamed responses (e.g. /shows?stream=1) still query the
+                # database while their chunks are produced
+                chunks = iter(response.response)
+                while True:
+                    chunk = await run(lambda: next(chunks, None))
+                    if chunk is None:
+                        break
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode(response.charset)
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                await send({'type': 'http.response.body', 'body': b''})
+                response.close()
+        finally:
+            ctx.pop()
+
+    def full_dispatch_request(self):
+        # as Flask.wsgi_app does
+        try:
+            return self.app.full_dispatch_request()
+        except Exception as e:
+            return self.app.make_response(self.app.handle_exception(e))
+
+
+def create_asgi_app(overrides=None, profile=None):
+    return AsyncApp(create_app(overrides, profile))
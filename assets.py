@@ -0,0 +1,223 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+
+import click
+
+from flask import current_app, request, send_from_directory, url_for
+from flask.cli import with_appcontext
+from werkzeug.exceptions import NotFound
+from werkzeug.utils import safe_join
+
+#----------------------------------------------------------------------------#
+# Static assets.
+#
+# `flask assets build` bundles and minifies the stylesheets and scripts of
+# BUNDLES, copies FILES, and writes each under a content-hashed name to
+# static/dist (next to static/css, so relative url()s keep working), with
+# precompressed .gz and .br siblings and a manifest. Templates link them
+# with asset_url/asset_urls, which fall back to the source files while
+# ASSETS_DEBUG is set or nothing has been built. Hashed files never change,
+# so they are served with a year-long immutable Cache-Control, and earlier
+# builds are left in place for pages (and caches) still linking them.
+#----------------------------------------------------------------------------#
+
+BUNDLES = {
+    'main.css': [
+        'css/bootstrap.min.css',
+        'css/layout.main.css',
+        'css/main.css',
+        'css/main.responsive.css',
+        'css/main.quickfix.css',
+    ],
+    # in <head>, before the page renders
+    'head.js': [
+        'js/libs/modernizr-2.8.2.min.js',
+        'js/libs/moment.min.js',
+        'js/script.js',
+    ],
+    # deferred, after jQuery
+    'main.js': [
+        'js/libs/bootstrap-3.1.1.min.js',
+        'js/plugins.js',
+    ],
+}
+# linked on their own, e.g. the jQuery fallback
+FILES = [
+    'js/libs/jquery-1.11.1.min.js',
+    'js/libs/respond-1.4.2.min.js',
+    'img/front-splash.jpg',
+]
+DIST = 'dist'
+MANIFEST = 'manifest.json'
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# most preferred first
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+COMPRESSIBLE = ('.css', '.js', '.svg')
+
+# strings and /*! license */ comments are kept as they are, other comments
+# dropped, whitespace collapsed and removed around punctuation
+CSS_TOKENS = re.compile(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*'|/\*!.*?\*/)|/\*.*?\*/|\s*([{};,>])\s*|\s+''', re.S)
+CSS_CHARSET = re.compile(r'@charset\s+["\'][^"\']*["\']\s*;', re.I)
+
+
+def minify_css(text):
+    def token(match):
+        if match.group(1):
+            return match.group(1)
+        if match.group(2):
+            return match.group(2)
+        return '' if match.group(0).startswith('/*') else ' '
+
+    return CSS_TOKENS.sub(token, CSS_CHARSET.sub('', text)).strip()
+
+
+def minify_js(text):
+    # e.g. our own plugins.js; the libraries ship minified already
+    try:
+        import rjsmin
+    except ImportError:
+        return text
+    return rjsmin.jsmin(text, keep_bang_comments=True)
+
+
+def compressed(data):
+    # e.g. {'.gz': b'...', '.br': b'...'}; .br only with the brotli package
+    siblings = {'.gz': gzip.compress(data, 9, mtime=0)}
+    try:
+        import brotli
+    except ImportError:
+        return siblings
+    siblings['.br'] = brotli.compress(data)
+    return siblings
+
+
+def fingerprinted(name, data):
+    # e.g. ('main.css', b'...') -> 'main.3f2a9c1b7d04.css'
+    stem, ext = os.path.splitext(os.path.basename(name))
+    return '{}.{}{}'.format(stem, hashlib.sha256(data).hexdigest()[:12], ext)
+
+
+def bundle(static_folder, name, sources):
+    parts = []
+    for source in sources:
+        with open(os.path.join(static_folder, source), encoding='utf-8') as f:
+            parts.append(f.read())
+    if name.endswith('.css'):
+        return '\n'.join(minify_css(i) for i in parts).encode('utf-8')
+    # a library without a trailing semicolon must not run into the next one
+    return ';\n'.join(minify_js(i) for i in parts).encode('utf-8')
+
+
+def build(static_folder):
+    # returns the manifest, e.g. {'main.css': 'dist/main.3f2a9c1b7d04.css'}
+    outputs = {name: bundle(static_folder, name, sources) for name, sources in BUNDLES.items()}
+    for name in FILES:
+        with open(os.path.join(static_folder, name), 'rb') as f:
+            outputs[name] = f.read()
+
+    dist = os.path.join(static_folder, DIST)
+    os.makedirs(dist, exist_ok=True)
+    manifest = {}
+    for name, data in outputs.items():
+        filename = fingerprinted(name, data)
+        manifest[name] = DIST + '/' + filename
+        files = {filename: data}
+        if filename.endswith(COMPRESSIBLE):
+            files.update((filename + suffix, i) for suffix, i in compressed(data).items())
+        for i, content in files.items():
+            with open(os.path.join(dist, i), 'wb') as f:
+                f.write(content)
+
+    with open(os.path.join(dist, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    # earlier builds' files stay, for pages still linking them
+    return manifest
+
+
+def load_manifest(static_folder):
+    try:
+        with open(os.path.join(static_folder, DIST, MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+#----------------------------------------------------------------------------#
+# Template helpers and serving.
+#----------------------------------------------------------------------------#
+
+def built(name):
+    if current_app.config['ASSETS_DEBUG']:
+        return None
+    return current_app.extensions['assets'].manifest.get(name)
+
+
+def asset_url(filename, **values):
+    # url_for('static', filename=...) for the built copy of a bundle or file,
+    # e.g. asset_url('js/libs/jquery-1.11.1.min.js')
+    return url_for('static', filename=built(filename) or filename, **values)
+
+
+def asset_urls(name):
+    # the built bundle, or its source files
+    if built(name):
+        return [asset_url(name)]
+    return [url_for('static', filename=i) for i in BUNDLES[name]]
+
+
+def send_static_file(filename):
+    if not filename.startswith(DIST + '/'):
+        return current_app.send_static_file(filename)
+
+    static_folder = current_app.static_folder
+    path = safe_join(static_folder, filename)
+    if path is None:
+        raise NotFound()
+    mimetype = mimetypes.guess_type(filename)[0]
+    for encoding, suffix in ENCODINGS:
+        if request.accept_encodings[encoding] and os.path.exists(path + suffix):
+            response = send_from_directory(static_folder, filename + suffix, mimetype=mimetype)
+            response.content_encoding = encoding
+            break
+    else:
+        response = send_from_directory(static_folder, filename, mimetype=mimetype)
+
+    response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = CACHE_CONTROL
+    return response
+
+
+@click.group('assets')
+def assets_cli():
+    """Build the static asset bundles."""
+
+
+@assets_cli.command('build')
+@with_appcontext
+def build_command():
+    """Bundle, minify, fingerprint and compress into static/dist."""
+    manifest = build(current_app.static_folder)
+    current_app.extensions['assets'].manifest = manifest
+    for name, path in sorted(manifest.items()):
+        click.echo('{} -> {}'.format(name, path))
+
+
+class Assets:
+    def __init__(self, app=None):
+        self.manifest = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.manifest = load_manifest(app.static_folder)
+        app.extensions['assets'] = self
+        app.jinja_env.globals.update(asset_url=asset_url, asset_urls=asset_urls)
+        app.view_functions['static'] = send_static_file
+        app.cli.add_command(assets_cli)
+
+
+assets = Assets()
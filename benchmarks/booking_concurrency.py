@@ -0,0 +1,152 @@
+"""Concurrent bookings of the same venue and artist.
+
+    python benchmarks/booking_concurrency.py --threads 16 --rounds 10
+    python benchmarks/booking_concurrency.py --database-url postgresql://localhost/fyyur_bench
+
+Posts the show create form from --threads threads at once, --rounds times,
+each round for a new time slot:
+
+- venue: every thread books a different artist at the same venue
+- artist: every thread books the same artist at a different venue
+
+Exactly one booking of each round may succeed, the others being refused as
+double bookings, and no two stored shows of the venue or the artist may
+overlap. Exits 1 when either does not hold. Runs against a fresh SQLite file
+unless --database-url points at an existing database.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def fill(app, threads):
+    # -> the ids of `threads` artists and `threads` venues
+    from db import session
+    from models.artist import Artist
+    from models.venue import Venue
+
+    with app.app_context():
+        artists = [Artist(name='Booking Artist {}'.format(i), city='Chicago', state='IL', phone='312-555-0100')
+                   for i in range(threads)]
+        venues = [Venue(name='Booking Venue {}'.format(i), city='Chicago', state='IL', address='1 Main St',
+                        phone='312-555-0100') for i in range(threads)]
+        session.add_all(artists + venues)
+        session.commit()
+        ids = [i.id for i in artists], [i.id for i in venues]
+        session.remove()
+    return ids
+
+
+def hammer(app, bookings):
+    # bookings: [(artist id, venue id, start_time)], one per thread, posted
+    # at once; -> (booked, refused, errors)
+    barrier = threading.Barrier(len(bookings))
+    booked, refused, errors = [], [], []
+    lock = threading.Lock()
+
+    def worker(artist_id, venue_id, start_time):
+        client = app.test_client()
+        data = {
+            'artist_id': artist_id,
+            'venue_id': venue_id,
+            'start_time': start_time.strftime('%Y-%m-%d %H:%M:%S'),
+            'end_time': (start_time + timedelta(hours=2)).strftime('%Y-%m-%d %H:%M:%S'),
+        }
+        barrier.wait()
+        try:
+            response = client.post('/shows/create', data=data, headers={'Referer': '/shows/create'})
+        except Exception as e:
+            with lock:
+                errors.append(repr(e))
+            return
+        location = response.headers.get('Location', '')
+        with lock:
+            if response.status_code == 302 and location.endswith('/shows'):
+                booked.append((artist_id, venue_id))
+            elif response.status_code == 302 and location.endswith('/shows/create'):
+                refused.append((artist_id, venue_id))
+            else:
+                errors.append('HTTP {}'.format(response.status_code))
+
+    pool = [threading.Thread(target=worker, args=i) for i in bookings]
+    for i in pool:
+        i.start()
+    for i in pool:
+        i.join()
+    return booked, refused, errors
+
+
+def overlaps(app, column, value):
+    # pairs of stored shows of one venue or artist that overlap
+    from db import session
+    from models.show import Show
+
+    with app.app_context():
+        rows = session.query(Show.id, Show.start_time, Show.end_time).filter(column == value).order_by(
+            Show.start_time, Show.id).all()
+        session.remove()
+    return [(a.id, b.id) for a, b in zip(rows, rows[1:]) if b.start_time < a.end_time]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Book the same venue and artist concurrently and check for double bookings.')
+    parser.add_argument('--database-url', help='An existing database; a fresh SQLite file is created otherwise.')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--rounds', type=int, default=10, help='Time slots booked per kind.')
+    args = parser.parse_args()
+
+    from app import create_app
+    from db import db
+    from models.show import Show
+
+    database_url = args.database_url
+    if database_url is None:
+        database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='fyyur-bench-'), 'bench.db')
+
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': database_url,
+        'SECRET_KEY': 'benchmark',
+        'CACHE_BACKEND': None,
+        'SQL_INSTRUMENTATION': False,
+        'WTF_CSRF_ENABLED': False,
+    }, 'testing')
+    if args.database_url is None:
+        with app.app_context():
+            db.create_all()
+
+    artist_ids, venue_ids = fill(app, args.threads)
+    start = datetime.now().replace(minute=0, second=0, microsecond=0) + timedelta(days=30)
+    failures = []
+    for kind in ('venue', 'artist'):
+        for round in range(args.rounds):
+            start_time = start + timedelta(hours=3 * round)
+            if kind == 'venue':
+                bookings = [(i, venue_ids[0], start_time) for i in artist_ids]
+            else:
+                bookings = [(artist_ids[0], i, start_time) for i in venue_ids]
+            booked, refused, errors = hammer(app, bookings)
+            if len(booked) != 1:
+                failures.append('{} round {}: {} bookings succeeded'.format(kind, round, len(booked)))
+            failures.extend('{} round {}: {}'.format(kind, round, i) for i in errors)
+            print('{:<6} round {:<3} {} booked, {} refused, {} errors'.format(
+                kind, round, len(booked), len(refused), len(errors)))
+        start += timedelta(days=30)
+
+    for column, value in ((Show.venue_id, venue_ids[0]), (Show.artist_id, artist_ids[0])):
+        for pair in overlaps(app, column, value):
+            failures.append('{} {}: shows {} and {} overlap'.format(column.key, value, *pair))
+
+    for i in failures[:10]:
+        print('    ' + i)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""Booking conflict check against one venue's long history.
+
+    python benchmarks/conflicts.py --shows 1000000
+    python benchmarks/conflicts.py --database-url postgresql://localhost/fyyur_conflicts --budget-ms 2
+
+Books --shows two hour shows (one every six hours, going back from now) at
+a single venue, spread over --artists artists, in a fresh SQLite file unless
+--database-url points at an empty database. Then times --checks calls of
+scheduling.conflicting_show for random one hour bookings over the same
+span, about half of which conflict, and reports the median and 99th
+percentile.
+
+Exits 1 when the median exceeds --budget-ms.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CHUNK_SIZE = 10000
+SPACING = timedelta(hours=6)
+DURATION = timedelta(hours=2)
+CHECKED = timedelta(hours=1)
+
+
+def fill(app, shows, artists, now):
+    from db import db
+    from models.artist import Artist
+    from models.show import Show
+    from models.venue import Venue
+
+    with app.app_context():
+        db.create_all()
+        with db.get_engine(app).begin() as conn:
+            conn.execute(Venue.__table__.insert(), [{
+                'id': 1, 'name': 'The Long Hall', 'city': 'Chicago', 'state': 'IL',
+                'address': '1 Main St', 'phone': '312-555-0100',
+            }])
+            conn.execute(Artist.__table__.insert(), [
+                {'id': i, 'name': 'Artist {}'.format(i), 'city': 'Chicago', 'state': 'IL', 'phone': '312-555-0100'}
+                for i in range(1, artists + 1)
+            ])
+            for offset in range(0, shows, CHUNK_SIZE):
+                rows = []
+                for i in range(offset, min(offset + CHUNK_SIZE, shows)):
+                    start_time = now - SPACING * (i + 1)
+                    # an artist plays every `artists` shows, never overlapping itself
+                    rows.append({'venue_id': 1, 'artist_id': i % artists + 1,
+                                 'start_time': start_time, 'end_time': start_time + DURATION})
+                conn.execute(Show.__table__.insert(), rows)
+            if conn.dialect.name == 'postgresql':
+                conn.exec_driver_sql('ANALYZE')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time the booking conflict check against a long show history.')
+    parser.add_argument('--database-url', help='An empty database; a fresh SQLite file otherwise.')
+    parser.add_argument('--shows', type=int, default=1000000)
+    parser.add_argument('--artists', type=int, default=50)
+    parser.add_argument('--checks', type=int, default=2000)
+    parser.add_argument('--budget-ms', type=float, default=1.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write the results as JSON.')
+    args = parser.parse_args()
+
+    from app import create_app
+    from scheduling import conflicting_show
+
+    database_url = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='fyyur-bench-'), 'conflicts.db')
+    app = create_app({'SQLALCHEMY_DATABASE_URI': database_url, 'SECRET_KEY': 'benchmark', 'SQL_INSTRUMENTATION': False}, 'production')
+    now = datetime.now().replace(minute=0, second=0, microsecond=0)
+    start = time.perf_counter()
+    fill(app, args.shows, args.artists, now)
+    print('{} shows booked in {:.1f} s'.format(args.shows, time.perf_counter() - start))
+
+    rng = random.Random(args.seed)
+    span = (SPACING * args.shows).total_seconds()
+    timings, conflicts = [], 0
+    with app.app_context():
+        for _ in range(args.checks):
+            start_time = now - timedelta(seconds=rng.uniform(0, span))
+            start = time.perf_counter()
+            # an artist with no shows, so only the venue's history is in the way
+            conflict = conflicting_show(args.artists + 1, 1, start_time, start_time + CHECKED)
+            timings.append((time.perf_counter() - start) * 1000)
+            conflicts += conflict is not None
+
+    results = {
+        'shows': args.shows,
+        'checks': args.checks,
+        'conflicts': conflicts,
+        'median_ms': round(statistics.median(timings), 3),
+        'p99_ms': round(statistics.quantiles(timings, n=100)[98], 3),
+    }
+    print('{checks} checks, {conflicts} conflicts: median {median_ms} ms, p99 {p99_ms} ms'.format(**results))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if results['median_ms'] > args.budget_ms:
+        sys.exit('median {} ms over the {} ms budget'.format(results['median_ms'], args.budget_ms))
+
+
+if __name__ == '__main__':
+    main()
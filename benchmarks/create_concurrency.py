@@ -0,0 +1,133 @@
+"""Concurrent create requests against the idempotency keys.
+
+    python benchmarks/create_concurrency.py --threads 32 --requests 8
+    python benchmarks/create_concurrency.py --database-url postgresql://localhost/fyyur_bench
+
+Posts the artist and venue create forms from --threads threads at once,
+--requests times per thread, in two rounds:
+
+- retries: every request of a round carries the same idempotency key, so
+  exactly one row is created and every response redirects to it
+- distinct: every request carries its own key, so every request creates a
+  row and redirects to its own one, never another request's
+
+and exits 1 when either does not hold. Runs against a fresh SQLite file
+unless --database-url points at an existing database.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FORMS = {
+    'artist': ('/artists/create', '/artists/', {
+        'city': 'Chicago', 'state': 'IL', 'phone': '312-555-0100', 'genres': 'Jazz',
+        'facebook_link': 'https://www.facebook.com/concurrency', 'image_link': '', 'website_link': '', 'seeking_description': '',
+    }),
+    'venue': ('/venues/create', '/venues/', {
+        'city': 'Chicago', 'state': 'IL', 'address': '1 Main St', 'phone': '312-555-0100', 'genres': 'Jazz',
+        'facebook_link': 'https://www.facebook.com/concurrency', 'image_link': '', 'website_link': '', 'seeking_description': '',
+    }),
+}
+
+
+def hammer(app, kind, threads, requests, same_key):
+    # returns {name: [redirected ids]} and the error responses
+    url, prefix, fields = FORMS[kind]
+    shared_key = uuid.uuid4().hex
+    barrier = threading.Barrier(threads)
+    results, errors = {}, []
+    lock = threading.Lock()
+
+    def worker(n):
+        client = app.test_client()
+        barrier.wait()
+        for i in range(requests):
+            key = shared_key if same_key else uuid.uuid4().hex
+            name = 'Concurrency {} {}'.format(shared_key[:8], 0 if same_key else '{}-{}'.format(n, i))
+            try:
+                response = client.post(url, data=dict(fields, name=name), headers={'Idempotency-Key': key})
+            except Exception as e:
+                with lock:
+                    errors.append((name, repr(e)))
+                continue
+            location = response.headers.get('Location', '')
+            with lock:
+                if response.status_code != 302 or prefix not in location:
+                    errors.append((name, 'HTTP {}'.format(response.status_code)))
+                else:
+                    results.setdefault(name, []).append(int(location.rsplit('/', 1)[1]))
+
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for i in pool:
+        i.start()
+    for i in pool:
+        i.join()
+    return results, errors
+
+
+def check(app, kind, threads, requests, same_key):
+    from db import session
+    from models.artist import Artist
+    from models.venue import Venue
+
+    model = {'artist': Artist, 'venue': Venue}[kind]
+    results, errors = hammer(app, kind, threads, requests, same_key)
+    failures = ['{} -> {}'.format(name, error) for name, error in errors]
+
+    with app.app_context():
+        for name, ids in results.items():
+            stored = [i for (i,) in session.query(model.id).filter(model.name == name)]
+            if same_key and len(set(ids)) != 1:
+                failures.append('{}: retries redirected to {} different rows'.format(name, len(set(ids))))
+            if sorted(stored) != sorted(set(ids)):
+                failures.append('{}: redirected to {}, stored {}'.format(name, sorted(set(ids)), stored))
+        session.remove()
+
+    rows = sum(len(set(i)) for i in results.values())
+    print('{:<6} {:<8} {} requests, {} rows created, {} failures'.format(
+        kind, 'retries' if same_key else 'distinct', threads * requests, rows, len(failures)))
+    for i in failures[:10]:
+        print('    ' + i)
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Post the create forms concurrently and check for duplicates.')
+    parser.add_argument('--database-url', help='An existing database; a fresh SQLite file is created otherwise.')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=4, help='Requests per thread.')
+    args = parser.parse_args()
+
+    from app import create_app
+    from db import db
+
+    database_url = args.database_url
+    if database_url is None:
+        database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='fyyur-bench-'), 'bench.db')
+
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': database_url,
+        'SECRET_KEY': 'benchmark',
+        'CACHE_BACKEND': None,
+        'SQL_INSTRUMENTATION': False,
+        'WTF_CSRF_ENABLED': False,
+    }, 'testing')
+    if args.database_url is None:
+        with app.app_context():
+            db.create_all()
+
+    failures = []
+    for kind in FORMS:
+        for same_key in (True, False):
+            failures.extend(check(app, kind, args.threads, args.requests, same_key))
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
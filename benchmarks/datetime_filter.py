@@ -0,0 +1,80 @@
+"""Per-call cost of the `datetime` template filter.
+
+    python benchmarks/datetime_filter.py [--calls N]
+
+First checks that formatting.DateTimeFormatter renders every named format
+(full, long, medium, short, FORMATS overriding Babel's) exactly as
+babel.dates.format_datetime does, in a few locales and timezones, and exits 1
+when one differs. Then compares the old filter (parse the string services
+used to produce, then babel.dates.format_datetime) with DateTimeFormatter on
+datetime objects, for each named format and a few locales.
+"""
+import argparse
+import os
+import sys
+import timeit
+
+from datetime import datetime
+
+import babel.dates
+import dateutil.parser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from formatting import FORMATS, NAMED_FORMATS, DateTimeFormatter
+
+LOCALES = ('en', 'de', 'ja', 'fr')
+TIMEZONES = (None, 'America/New_York', 'Asia/Kolkata')
+
+
+def legacy_format_datetime(value, format='medium'):
+    date = dateutil.parser.parse(value)
+    return babel.dates.format_datetime(date, FORMATS.get(format, format), locale='en')
+
+
+def check(formatter, value):
+    # -> (format, locale, timezone, rendered, Babel's) where they differ
+    wrong = []
+    for fmt in NAMED_FORMATS + tuple(i for i in FORMATS if i not in NAMED_FORMATS):
+        for locale in LOCALES:
+            for tz in TIMEZONES:
+                expected = babel.dates.format_datetime(
+                    value, FORMATS.get(fmt, fmt), locale=locale,
+                    tzinfo=babel.dates.get_timezone(tz) if tz else None,
+                )
+                rendered = formatter(value, fmt, locale, tz)
+                if rendered != expected:
+                    wrong.append((fmt, locale, tz, rendered, expected))
+    return wrong
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--calls', type=int, default=20000)
+    args = parser.parse_args()
+
+    value = datetime(2023, 4, 12, 21, 30)
+    string = value.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+    formatter = DateTimeFormatter()
+
+    wrong = check(formatter, value)
+    for i in wrong:
+        print('{} {} {}: {!r}, Babel {!r}'.format(*i))
+    if wrong:
+        sys.exit('{} formats differ from babel.dates.format_datetime'.format(len(wrong)))
+
+    cases = [('legacy', fmt, 'en', lambda fmt=fmt: legacy_format_datetime(string, fmt)) for fmt in NAMED_FORMATS]
+    for locale in ('en', 'de', 'ja'):
+        for fmt in NAMED_FORMATS:
+            cases.append(('cached', fmt, locale, lambda fmt=fmt, locale=locale: formatter(value, fmt, locale)))
+    cases.append(('cached+tz', 'full', 'en', lambda: formatter(value, 'full', tzinfo='America/New_York')))
+
+    print('{:<10} {:<7} {:<7} {:>12}'.format('filter', 'format', 'locale', 'us/call'))
+    for name, fmt, locale, call in cases:
+        call()
+        seconds = timeit.timeit(call, number=args.calls)
+        print('{:<10} {:<7} {:<7} {:>12.2f}'.format(name, fmt, locale, seconds / args.calls * 1e6))
+
+
+if __name__ == '__main__':
+    main()
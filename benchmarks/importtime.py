@@ -0,0 +1,114 @@
+"""Startup budget: import time of `app` plus create_app().
+
+    python benchmarks/importtime.py
+    python benchmarks/importtime.py --budget-ms 600 --runs 7
+
+Starts --runs fresh Python processes under `python -X importtime` for each
+startup mode, each importing app and calling create_app(), and reports the
+median wall time and the slowest top-level imports:
+
+- web: everything a worker registers
+- cli: REGISTER_BLUEPRINTS off, as for cron jobs
+
+Exits 1 when a mode's median exceeds --budget-ms, or when a module that is
+meant to load on first use (DEFERRED) was imported at startup.
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODES = {
+    'web': {},
+    'cli': {'REGISTER_BLUEPRINTS': False},
+}
+# loaded on first use, never by create_app; per mode (the blueprints' forms
+# bring in Babel through Flask-WTF)
+DEFERRED = {
+    'web': ['flask_moment', 'flask_migrate', 'alembic', 'dateutil.parser'],
+    'cli': ['flask_moment', 'flask_migrate', 'alembic', 'babel.dates', 'dateutil.parser', 'forms', 'wtforms'],
+}
+CHILD = '''
+import json, sys, time
+start = time.perf_counter()
+from app import create_app
+create_app(json.loads(sys.argv[1]), 'production')
+print(json.dumps({'ms': (time.perf_counter() - start) * 1000}))
+'''
+# e.g. 'import time:       796 |     366067 |   db', two spaces per level
+IMPORT_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$')
+
+
+def run(overrides):
+    # returns (wall ms, {module: cumulative us}, {imported module names}), the
+    # modules being those app imports and those create_app imports
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', CHILD, json.dumps(overrides)],
+        cwd=ROOT, check=True, capture_output=True, text=True,
+    )
+    top, modules, children, after_app = {}, set(), {}, False
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if not match:
+            continue
+        cumulative, depth, name = int(match.group(2)), len(match.group(3)) // 2, match.group(4)
+        modules.add(name)
+        # a module's line comes after those of the modules it imported
+        if depth == 1:
+            children[name] = cumulative
+        elif depth == 0:
+            if name == 'app':
+                top.update(children)
+                after_app = True
+            elif after_app:
+                top[name] = cumulative
+            children = {}
+    return json.loads(result.stdout.strip().splitlines()[-1])['ms'], top, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check import plus create_app() time against a budget.')
+    parser.add_argument('--budget-ms', type=float, default=1000)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=8, help='Slowest top-level imports to list.')
+    parser.add_argument('--output', help='Write the results as JSON.')
+    args = parser.parse_args()
+
+    overrides = {'SECRET_KEY': 'benchmark', 'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'TEMPLATE_CACHE_DIR': None}
+    results, failures = {}, []
+    for mode, values in MODES.items():
+        runs = [run(dict(overrides, **values)) for _ in range(args.runs)]
+        median = statistics.median(i[0] for i in runs)
+        top = {name: statistics.median(i[1].get(name, 0) for i in runs) / 1000 for name in runs[0][1]}
+        loaded = sorted(i for i in DEFERRED[mode] if any(i in modules for _, _, modules in runs))
+        results[mode] = {
+            'median_ms': round(median, 1),
+            'top_imports_ms': {name: round(ms, 1) for name, ms in sorted(top.items(), key=lambda i: -i[1])[:args.top]},
+            'deferred_imported': loaded,
+        }
+
+        print('{:<4} {:>7.1f} ms (budget {} ms)'.format(mode, median, args.budget_ms))
+        for name, ms in results[mode]['top_imports_ms'].items():
+            print('    {:>7.1f} ms  {}'.format(ms, name))
+        if median > args.budget_ms:
+            failures.append('{}: {:.1f} ms over the {} ms budget'.format(mode, median, args.budget_ms))
+        for name in loaded:
+            failures.append('{}: {} is imported at startup'.format(mode, name))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    for i in failures:
+        print(i)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
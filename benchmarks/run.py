@@ -0,0 +1,210 @@
+"""Route latency benchmark.
+
+    python benchmarks/run.py --output bench.json
+    python benchmarks/run.py --database-url postgresql://localhost/fyyur_bench --compare bench.json
+
+Seeds a database with benchmarks/seed.py (a fresh SQLite file unless
+--database-url points at an existing one), then requests every read route
+registered by the blueprints in services/ through the Flask test client.
+For each route it reports p50/p95/p99 latency, queries per request (from
+the Server-Timing header) and peak Python memory of one request, and
+writes them as JSON. With --compare, routes whose p95 or query count grew
+beyond --tolerance against an earlier run are listed and the exit status
+is 1.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from seed import seed
+
+# write routes are left out: they would change the dataset between runs
+SKIPPED_METHODS = {'DELETE'}
+SEARCH_FORMS = {
+    'artist.search_artists': {'search_term': 'Blue'},
+    'venue.search_venues': {'search_term': 'The'},
+}
+# query strings of routes without arguments to draw
+QUERY_ARGS = {
+    'api.venues_near': {'lat': 41.8781, 'lng': -87.6298, 'radius_km': 25},
+}
+QUERIES = re.compile(r'desc="(\d+) queries')
+
+
+def route_cases(app, rng, samples):
+    # (name, method, url, form data) for every read route, with ids drawn
+    # from the seeded rows
+    from db import session
+    from models.artist import Artist
+    from models.show import Show
+    from models.venue import Venue
+    from flask import url_for
+
+    with app.app_context():
+        artist_ids = [i for (i,) in session.query(Artist.id)]
+        venue_ids = [i for (i,) in session.query(Venue.id)]
+        show_ids = [i for (i,) in session.query(Show.id).limit(1000)]
+
+    values = {
+        'artist_id': artist_ids,
+        'venue_id': venue_ids,
+        'show_id': show_ids,
+        'genre': ['Jazz', 'Rock n Roll', 'Classical'],
+    }
+
+    cases = []
+    for rule in sorted(app.url_map.iter_rules(), key=lambda i: i.rule):
+        if '.' not in rule.endpoint:
+            continue
+        if 'GET' in rule.methods:
+            method = 'GET'
+        elif rule.endpoint in SEARCH_FORMS:
+            method = 'POST'
+        else:
+            continue
+        if rule.methods & SKIPPED_METHODS:
+            continue
+
+        urls = []
+        for _ in range(samples):
+            args = {i: rng.choice(values[i]) for i in rule.arguments}
+            with app.test_request_context():
+                urls.append(url_for(rule.endpoint, **args, **QUERY_ARGS.get(rule.endpoint, {})))
+        cases.append((rule.endpoint, method, urls, SEARCH_FORMS.get(rule.endpoint)))
+
+    return cases
+
+
+def percentile(timings, p):
+    if len(timings) < 2:
+        return timings[0]
+    return statistics.quantiles(timings, n=100, method='inclusive')[p - 1]
+
+
+def run_case(client, method, urls, data):
+    # one untimed request first, so template compilation is not measured
+    client.open(urls[0], method=method, data=data).get_data()
+
+    timings, queries, statuses = [], [], set()
+    for url in urls:
+        start = time.perf_counter()
+        response = client.open(url, method=method, data=data)
+        response.get_data()
+        timings.append((time.perf_counter() - start) * 1000)
+        statuses.add(response.status_code)
+        match = QUERIES.search(response.headers.get('Server-Timing', ''))
+        if match:
+            queries.append(int(match.group(1)))
+
+    tracemalloc.start()
+    client.open(urls[0], method=method, data=data).get_data()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        'requests': len(urls),
+        'status': sorted(statuses),
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'mean_ms': round(statistics.mean(timings), 3),
+        'queries_per_request': round(statistics.mean(queries), 2) if queries else None,
+        'peak_memory_kib': round(peak / 1024, 1),
+    }
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, current in results['routes'].items():
+        previous = baseline['routes'].get(name)
+        if previous is None:
+            continue
+        if current['p95_ms'] > previous['p95_ms'] * (1 + tolerance):
+            regressions.append('{}: p95 {} ms -> {} ms'.format(name, previous['p95_ms'], current['p95_ms']))
+        if (current['queries_per_request'] or 0) > (previous['queries_per_request'] or 0):
+            regressions.append('{}: queries {} -> {}'.format(
+                name, previous['queries_per_request'], current['queries_per_request']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark every read route on a seeded database.')
+    parser.add_argument('--database-url', help='An already seeded database; a fresh SQLite file is seeded otherwise.')
+    parser.add_argument('--venues', type=int, default=500)
+    parser.add_argument('--artists', type=int, default=1000)
+    parser.add_argument('--shows', type=int, default=20000)
+    parser.add_argument('--requests', type=int, default=50, help='Requests per route.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--cache', action='store_true', help='Keep the page cache on.')
+    parser.add_argument('--output', default='bench_output.json')
+    parser.add_argument('--compare', help='An earlier --output file to check for regressions.')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed p95 growth, e.g. 0.2 for 20%%.')
+    args = parser.parse_args()
+
+    from app import create_app
+
+    database_url = args.database_url
+    if database_url is None:
+        path = os.path.join(tempfile.mkdtemp(prefix='fyyur-bench-'), 'bench.db')
+        database_url = 'sqlite:///' + path
+
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': database_url,
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+        'CACHE_BACKEND': 'lru' if args.cache else None,
+        'SQL_INSTRUMENTATION': True,
+    })
+    if args.database_url is None:
+        seed(app, args.venues, args.artists, args.shows, args.seed)
+
+    rng = random.Random(args.seed)
+    client = app.test_client()
+    results = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'database': app.config['SQLALCHEMY_DATABASE_URI'].split(':', 1)[0],
+            'venues': args.venues,
+            'artists': args.artists,
+            'shows': args.shows,
+            'requests_per_route': args.requests,
+            'cache': args.cache,
+        },
+        'routes': {},
+    }
+
+    print('{:<32} {:>9} {:>9} {:>9} {:>8} {:>10}'.format('route', 'p50 ms', 'p95 ms', 'p99 ms', 'queries', 'peak KiB'))
+    for name, method, urls, data in route_cases(app, rng, args.requests):
+        result = run_case(client, method, urls, data)
+        results['routes'][name] = result
+        print('{:<32} {:>9.2f} {:>9.2f} {:>9.2f} {:>8} {:>10.1f}'.format(
+            name, result['p50_ms'], result['p95_ms'], result['p99_ms'],
+            result['queries_per_request'] if result['queries_per_request'] is not None else '-',
+            result['peak_memory_kib']))
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print('REGRESSION ' + regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
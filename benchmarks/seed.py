@@ -0,0 +1,171 @@
+"""Synthetic catalog generator.
+
+    python benchmarks/seed.py sqlite:////tmp/fyyur-bench.db --venues 2000 --artists 5000 --shows 200000
+
+Creates the schema on an empty database and fills it with venues, artists
+and shows following skewed, catalog-like distributions:
+
+- areas: a few big cities hold most venues and artists (Zipf over cities),
+  venues scattered around the city's point
+- shows: popular venues and artists get most bookings (Pareto weights)
+- time: most shows are in the past few years, the rest in the next months,
+  never two at once at a venue or for an artist
+"""
+import argparse
+import os
+import random
+import sys
+
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CITIES = [
+    ('New York', 'NY'), ('Los Angeles', 'CA'), ('Chicago', 'IL'), ('Houston', 'TX'),
+    ('Phoenix', 'AZ'), ('Philadelphia', 'PA'), ('San Antonio', 'TX'), ('San Diego', 'CA'),
+    ('Dallas', 'TX'), ('San Jose', 'CA'), ('Austin', 'TX'), ('Jacksonville', 'FL'),
+    ('San Francisco', 'CA'), ('Columbus', 'OH'), ('Seattle', 'WA'), ('Denver', 'CO'),
+    ('Washington', 'DC'), ('Boston', 'MA'), ('Nashville', 'TN'), ('Detroit', 'MI'),
+    ('Portland', 'OR'), ('Las Vegas', 'NV'), ('Memphis', 'TN'), ('Louisville', 'KY'),
+    ('Baltimore', 'MD'), ('Milwaukee', 'WI'), ('Albuquerque', 'NM'), ('Tucson', 'AZ'),
+    ('Sacramento', 'CA'), ('Atlanta', 'GA'), ('Omaha', 'NE'), ('Raleigh', 'NC'),
+    ('Miami', 'FL'), ('Minneapolis', 'MN'), ('New Orleans', 'LA'), ('Cleveland', 'OH'),
+]
+WORDS = [
+    'Blue', 'Red', 'Golden', 'Velvet', 'Electric', 'Midnight', 'Silver', 'Wild',
+    'Hollow', 'Neon', 'Crimson', 'Lucky', 'Rusty', 'Echo', 'Lunar', 'Broken',
+    'Moon', 'Owl', 'Fox', 'Tavern', 'Room', 'Hall', 'Lounge', 'Garden', 'Cellar',
+    'Riders', 'Kings', 'Sisters', 'Machine', 'Collective', 'Band', 'Orchestra',
+]
+
+CHUNK_SIZE = 5000
+SHOW_HOURS = 2
+
+
+def zipf_weights(n, s=1.1):
+    return [1 / (rank ** s) for rank in range(1, n + 1)]
+
+
+def pareto_weights(rng, n, alpha=1.5):
+    return [rng.paretovariate(alpha) for _ in range(n)]
+
+
+def phone(rng):
+    return '{:03d}-{:03d}-{:04d}'.format(rng.randint(200, 999), rng.randint(200, 999), rng.randint(0, 9999))
+
+
+def name(rng, words):
+    return ' '.join(rng.sample(WORDS, words))
+
+
+def insert(conn, table, rows):
+    for i in range(0, len(rows), CHUNK_SIZE):
+        conn.execute(table.insert(), rows[i:i + CHUNK_SIZE])
+
+
+def seed(app, venues=500, artists=1000, shows=20000, random_seed=0, now=None):
+    from db import db
+    from forms import GENRE_CHOICES
+    from geo import CSVGeocoder, cell
+    from models.artist import Artist
+    from models.genre import Genre, artist_genre, venue_genre
+    from models.show import Show
+    from models.venue import Venue
+    from stats import rebuild
+
+    rng = random.Random(random_seed)
+    now = now or datetime.now()
+    city_weights = zipf_weights(len(CITIES))
+    genre_ids = list(range(1, len(GENRE_CHOICES) + 1))
+    geocoder = CSVGeocoder(app.config['GEOCODER_CSV'])
+
+    with app.app_context():
+        db.create_all()
+        engine = db.get_engine(app)
+        with engine.begin() as conn:
+            insert(conn, Genre.__table__, [{'id': i, 'name': choice[0]} for i, choice in zip(genre_ids, GENRE_CHOICES)])
+
+            venue_rows, venue_genres = [], []
+            venue_cities = rng.choices(CITIES, city_weights, k=venues)
+            for id, (city, state) in enumerate(venue_cities, 1):
+                # within about 15 km of the city's point in the geocoder's CSV
+                latitude, longitude = geocoder.geocode('', city, state)
+                latitude += rng.uniform(-0.15, 0.15)
+                longitude += rng.uniform(-0.15, 0.15)
+                venue_rows.append({
+                    'id': id, 'name': 'The ' + name(rng, 2), 'city': city, 'state': state,
+                    'address': '{} {} St'.format(rng.randint(1, 9999), rng.choice(WORDS)),
+                    'phone': phone(rng), 'seeking_talent': rng.random() < 0.3,
+                    'image_link': 'https://example.com/venues/{}.jpg'.format(id),
+                    'latitude': latitude, 'longitude': longitude, 'geocell': cell(latitude, longitude),
+                })
+                venue_genres.extend({'venue_id': id, 'genre_id': g} for g in rng.sample(genre_ids, rng.randint(1, 3)))
+            insert(conn, Venue.__table__, venue_rows)
+            insert(conn, venue_genre, venue_genres)
+
+            artist_rows, artist_genres = [], []
+            artist_cities = rng.choices(CITIES, city_weights, k=artists)
+            for id, (city, state) in enumerate(artist_cities, 1):
+                artist_rows.append({
+                    'id': id, 'name': name(rng, rng.randint(1, 3)), 'city': city, 'state': state,
+                    'phone': phone(rng), 'seeking_venue': rng.random() < 0.3,
+                    'image_link': 'https://example.com/artists/{}.jpg'.format(id),
+                })
+                artist_genres.extend({'artist_id': id, 'genre_id': g} for g in rng.sample(genre_ids, rng.randint(1, 3)))
+            insert(conn, Artist.__table__, artist_rows)
+            insert(conn, artist_genre, artist_genres)
+
+            show_venues = rng.choices(range(1, venues + 1), pareto_weights(rng, venues), k=shows)
+            show_artists = rng.choices(range(1, artists + 1), pareto_weights(rng, artists), k=shows)
+            show_rows, booked = [], set()
+            for id, venue_id, artist_id in zip(range(1, shows + 1), show_venues, show_artists):
+                # two hour shows on the hour, drawn again while the venue or
+                # the artist is booked for either hour
+                while True:
+                    if rng.random() < 0.8:
+                        start_time = now - timedelta(days=rng.uniform(0, 5 * 365))
+                    else:
+                        start_time = now + timedelta(days=rng.uniform(0, 180))
+                    start_time = start_time.replace(minute=0, second=0, microsecond=0)
+                    slots = [(kind, i, start_time + timedelta(hours=h))
+                             for kind, i in (('venue', venue_id), ('artist', artist_id)) for h in range(SHOW_HOURS)]
+                    if booked.isdisjoint(slots):
+                        booked.update(slots)
+                        break
+                show_rows.append({
+                    'id': id,
+                    'venue_id': venue_id,
+                    'artist_id': artist_id,
+                    'start_time': start_time,
+                    'end_time': start_time + timedelta(hours=SHOW_HOURS),
+                })
+                if len(show_rows) == CHUNK_SIZE:
+                    insert(conn, Show.__table__, show_rows)
+                    show_rows = []
+            insert(conn, Show.__table__, show_rows)
+
+            rebuild(conn, now)
+
+            if conn.dialect.name == 'postgresql':
+                # ids were inserted explicitly, move the sequences past them
+                for table in ('genre', 'venue', 'artist', 'show'):
+                    conn.exec_driver_sql("SELECT setval('{0}_id_seq', (SELECT max(id) FROM \"{0}\"))".format(table))
+                conn.exec_driver_sql('ANALYZE')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fill an empty database with a synthetic catalog.')
+    parser.add_argument('database_url')
+    parser.add_argument('--venues', type=int, default=500)
+    parser.add_argument('--artists', type=int, default=1000)
+    parser.add_argument('--shows', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    from app import create_app
+    app = create_app({'SQLALCHEMY_DATABASE_URI': args.database_url, 'SQLALCHEMY_TRACK_MODIFICATIONS': False})
+    seed(app, args.venues, args.artists, args.shows, args.seed)
+
+
+if __name__ == '__main__':
+    main()
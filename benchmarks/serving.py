@@ -0,0 +1,168 @@
+"""Requests/sec of the sync (WSGI) and async (ASGI) serving modes.
+
+    python benchmarks/serving.py --workers 2 --concurrency 64 --duration 10
+    python benchmarks/serving.py --database-url postgresql://localhost/fyyur_bench
+
+Seeds a database with benchmarks/seed.py (a fresh SQLite file unless
+--database-url points at an existing one), then serves the app with
+gunicorn twice, once with sync workers and once with uvicorn workers
+running asgi.create_asgi_app, and drives the listing and search routes
+with --concurrency clients for --duration seconds against each. The page
+cache is off so every request reaches the database.
+
+Needs gunicorn, uvicorn, httpx and the async driver (aiosqlite or asyncpg).
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MODES = {
+    'wsgi': 'sync',
+    'asgi': 'uvicorn.workers.UvicornWorker',
+}
+REQUESTS = [
+    ('GET', '/venues', None),
+    ('GET', '/artists', None),
+    ('GET', '/shows', None),
+    ('GET', '/venues/genres/Jazz', None),
+    ('POST', '/artists/search', {'search_term': 'Blue'}),
+    ('POST', '/venues/search', {'search_term': 'The'}),
+]
+
+
+def serve(mode, database_url, port, workers):
+    from gunicorn.app.base import BaseApplication
+
+    overrides = {
+        'SQLALCHEMY_DATABASE_URI': database_url,
+        'SECRET_KEY': 'benchmark',
+        'CACHE_BACKEND': None,
+        'SQL_INSTRUMENTATION': False,
+        'WTF_CSRF_ENABLED': False,
+    }
+
+    class Server(BaseApplication):
+        def load_config(self):
+            self.cfg.set('bind', '127.0.0.1:{}'.format(port))
+            self.cfg.set('workers', workers)
+            self.cfg.set('worker_class', MODES[mode])
+            self.cfg.set('loglevel', 'warning')
+
+        def load(self):
+            if mode == 'asgi':
+                from asgi import create_asgi_app
+                return create_asgi_app(overrides, 'production')
+            from app import create_app
+            return create_app(overrides, 'production')
+
+    Server().run()
+
+
+def wait_for(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('Server on port {} did not start.'.format(port))
+
+
+async def load(port, concurrency, duration):
+    import httpx
+
+    timings, errors = [], 0
+    deadline = time.perf_counter() + duration
+    limits = httpx.Limits(max_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url='http://127.0.0.1:{}'.format(port), limits=limits, timeout=60) as client:
+        async def worker(offset):
+            nonlocal errors
+            i = offset
+            while time.perf_counter() < deadline:
+                method, url, data = REQUESTS[i % len(REQUESTS)]
+                i += 1
+                start = time.perf_counter()
+                try:
+                    response = await client.request(method, url, data=data)
+                except httpx.TransportError:
+                    # e.g. a sync worker closing a kept-alive connection
+                    errors += 1
+                    continue
+                timings.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*[worker(i) for i in range(concurrency)])
+        elapsed = time.perf_counter() - start
+
+    percentiles = statistics.quantiles(timings, n=100, method='inclusive')
+    return {
+        'requests': len(timings),
+        'errors': errors,
+        'requests_per_sec': round(len(timings) / elapsed, 1),
+        'p50_ms': round(percentiles[49] * 1000, 2),
+        'p99_ms': round(percentiles[98] * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare requests/sec of the WSGI and ASGI serving modes.')
+    parser.add_argument('--database-url', help='An already seeded database; a fresh SQLite file is seeded otherwise.')
+    parser.add_argument('--venues', type=int, default=500)
+    parser.add_argument('--artists', type=int, default=1000)
+    parser.add_argument('--shows', type=int, default=20000)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--output', help='Write the results as JSON.')
+    parser.add_argument('--serve', choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        return serve(args.serve, args.database_url, args.port, args.workers)
+
+    database_url = args.database_url
+    if database_url is None:
+        from app import create_app
+        from seed import seed
+
+        database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='fyyur-bench-'), 'bench.db')
+        seed(create_app({'SQLALCHEMY_DATABASE_URI': database_url}), args.venues, args.artists, args.shows)
+
+    results = {}
+    for mode in MODES:
+        server = subprocess.Popen([
+            sys.executable, os.path.abspath(__file__), '--serve', mode,
+            '--database-url', database_url, '--port', str(args.port), '--workers', str(args.workers),
+        ])
+        try:
+            wait_for(args.port)
+            asyncio.run(load(args.port, args.concurrency, 1))  # warm up
+            results[mode] = asyncio.run(load(args.port, args.concurrency, args.duration))
+        finally:
+            server.terminate()
+            server.wait()
+
+        print('{:<5} {requests_per_sec:>9} req/s  p50 {p50_ms:>8} ms  p99 {p99_ms:>8} ms  '
+              '{requests} requests, {errors} errors'.format(mode, **results[mode]))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""Cold start benchmark: import, create_app and first request per route.
+
+    python benchmarks/startup.py --output startup.json
+    python benchmarks/startup.py --database-url postgresql://localhost/fyyur_bench --runs 5
+
+Seeds a database with benchmarks/seed.py (a fresh SQLite file unless
+--database-url points at an existing one). Then, for every read route of
+benchmarks/run.py, it starts --runs fresh Python processes per template mode
+and times `import app`, create_app() with the worker startup that follows it
+(templating.start_worker) and the first request to that route:
+
+- lazy: templates compiled on first use, as before templating.py
+- preload: every template compiled in memory at startup
+- bytecode: every template loaded at startup from `flask templates compile`
+
+The median of the runs is reported per route and mode.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MODES = {
+    'lazy': {'TEMPLATE_CACHE_DIR': None, 'TEMPLATE_PRELOAD': False},
+    'preload': {'TEMPLATE_CACHE_DIR': None, 'TEMPLATE_PRELOAD': True},
+    'bytecode': {'TEMPLATE_PRELOAD': True},
+}
+
+
+def overrides(database_url, mode, cache_dir):
+    values = {
+        'SQLALCHEMY_DATABASE_URI': database_url,
+        'SECRET_KEY': 'benchmark',
+        'CACHE_BACKEND': None,
+        'TEMPLATE_CACHE_DIR': cache_dir,
+    }
+    values.update(MODES[mode])
+    return values
+
+
+def child(config):
+    # runs in the fresh process; prints the timings as JSON
+    start = time.perf_counter()
+    from app import create_app
+    from templating import start_worker
+    imported = time.perf_counter()
+    app = create_app(config['overrides'], 'production')
+    start_worker(app)
+    created = time.perf_counter()
+    response = app.test_client().open(config['url'], method=config['method'], data=config['data'])
+    response.get_data()
+    finished = time.perf_counter()
+
+    print(json.dumps({
+        'status': response.status_code,
+        'import_ms': (imported - start) * 1000,
+        'create_app_ms': (created - imported) * 1000,
+        'first_request_ms': (finished - created) * 1000,
+    }))
+
+
+def spawn(config):
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child', json.dumps(config)],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time import, create_app and the first request of every read route.')
+    parser.add_argument('--database-url', help='An already seeded database; a fresh SQLite file is seeded otherwise.')
+    parser.add_argument('--venues', type=int, default=500)
+    parser.add_argument('--artists', type=int, default=1000)
+    parser.add_argument('--shows', type=int, default=20000)
+    parser.add_argument('--runs', type=int, default=3, help='Fresh processes per route and mode.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write the results as JSON.')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return child(json.loads(args.child))
+
+    from app import create_app
+    from run import route_cases
+    from seed import seed
+
+    workdir = tempfile.mkdtemp(prefix='fyyur-bench-')
+    database_url = args.database_url
+    if database_url is None:
+        database_url = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+    cache_dir = os.path.join(workdir, 'templates')
+
+    app = create_app(overrides(database_url, 'bytecode', cache_dir), 'production')
+    if args.database_url is None:
+        seed(app, args.venues, args.artists, args.shows, args.seed)
+    result = app.test_cli_runner().invoke(args=['templates', 'compile'])
+    if result.exit_code != 0:
+        sys.exit(result.output)
+
+    results = {}
+    for name, method, urls, data in route_cases(app, random.Random(args.seed), 1):
+        results[name] = {}
+        for mode in MODES:
+            config = {'overrides': overrides(database_url, mode, cache_dir), 'url': urls[0], 'method': method, 'data': data}
+            runs = [spawn(config) for _ in range(args.runs)]
+            results[name][mode] = {
+                key: round(statistics.median(i[key] for i in runs), 2)
+                for key in ('import_ms', 'create_app_ms', 'first_request_ms')
+            }
+            results[name][mode]['status'] = sorted({i['status'] for i in runs})
+
+        print('{:<32} '.format(name) + '  '.join(
+            '{} {:>7.1f} + {:>6.1f} ms'.format(mode, results[name][mode]['create_app_ms'], results[name][mode]['first_request_ms'])
+            for mode in MODES))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
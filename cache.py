@@ -0,0 +1,261 @@
+import functools
+import threading
+import time
+
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from flask import Response, current_app, g, has_app_context, jsonify, make_response, request
+from flask import session as flask_session
+from sqlalchemy import event
+from werkzeug.utils import import_string
+
+from db import session
+from models.artist import Artist
+from models.show import Show
+from models.venue import Venue
+
+#----------------------------------------------------------------------------#
+# Page cache.
+#
+# Cached GET pages are stored with a set of tags naming the data they were
+# built from, e.g. the page of venue 5 is tagged 'venue:5' plus 'artist:N'
+# for every artist it lists. Committed writes evict the tags of the rows
+# they touched, so editing one venue only drops that venue's page, the
+# listings it appears in, and the pages that show it.
+#
+# Pages splitting shows into upcoming and past also go stale with time
+# alone, so every entry expires after CACHE_TTL seconds, or sooner when the
+# view reports (cache.expires) when its next show starts. The LRU backend
+# lives in one process: in a multi-worker deployment a write only evicts the
+# pages of the worker handling it, so production needs a shared backend or
+# no cache at all (CACHE_SHARED_ONLY).
+#----------------------------------------------------------------------------#
+
+
+class CacheBackend:
+    # Interface for cache storage. A shared backend (memcached, redis, ...)
+    # implements these so every worker sees the same entries and evictions;
+    # `generation` may stay constant if it cannot be tracked cheaply, and
+    # `ttl` is in seconds. `shared` tells whether the workers share entries.
+    shared = True
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value, tags, generation=None, ttl=None):
+        raise NotImplementedError
+
+    def invalidate(self, tags):
+        raise NotImplementedError
+
+    @property
+    def generation(self):
+        return None
+
+    def stats(self):
+        raise NotImplementedError
+
+
+class LRUCacheBackend(CacheBackend):
+    # In-process, per worker: entries and evictions are not shared.
+    shared = False
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.keys_by_tag = {}
+        self.lock = threading.Lock()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.expirations = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[2] is not None and entry[2] <= time.monotonic():
+                self._delete(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, tags, generation=None, ttl=None):
+        with self.lock:
+            if generation is not None and generation != self._generation:
+                # something was invalidated while the page was being built,
+                # it may already be stale
+                return
+            self._delete(key)
+            self.entries[key] = (value, tags, None if ttl is None else time.monotonic() + ttl)
+            for tag in tags:
+                self.keys_by_tag.setdefault(tag, set()).add(key)
+            while len(self.entries) > self.max_entries:
+                self._delete(next(iter(self.entries)))
+                self.evictions += 1
+
+    def invalidate(self, tags):
+        with self.lock:
+            self._generation += 1
+            for tag in tags:
+                for key in self.keys_by_tag.pop(tag, ()):
+                    if self._delete(key):
+                        self.invalidations += 1
+
+    @property
+    def generation(self):
+        return self._generation
+
+    def _delete(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return False
+        for tag in entry[1]:
+            keys = self.keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.keys_by_tag[tag]
+        return True
+
+    def stats(self):
+        with self.lock:
+            return {
+                'backend': 'lru',
+                'entries': len(self.entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'expirations': self.expirations,
+            }
+
+
+BACKENDS = {
+    'lru': LRUCacheBackend,
+}
+
+
+class Cache:
+    def __init__(self, app=None):
+        self._listening = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        name = app.config.get('CACHE_BACKEND', 'lru')
+        if not name:
+            backend = None
+        elif name in BACKENDS:
+            backend = BACKENDS[name](app.config.get('CACHE_MAX_ENTRIES', 1024))
+        else:
+            # e.g. 'myproject.cache:RedisCacheBackend'
+            backend = import_string(name)(app)
+        if backend is not None and not backend.shared and app.config.get('CACHE_SHARED_ONLY'):
+            raise RuntimeError('CACHE_BACKEND {!r} is per process; set a shared backend or None.'.format(name))
+
+        app.extensions['cache'] = backend
+        app.add_url_rule('/cache/stats', 'cache_stats', cache_stats)
+
+        if not self._listening:
+            event.listen(session, 'after_flush', _collect_changes)
+            event.listen(session, 'after_commit', _apply_changes)
+            event.listen(session, 'after_transaction_end', _discard_changes)
+            self._listening = True
+
+    @property
+    def backend(self):
+        return current_app.extensions.get('cache')
+
+    def tag(self, *tags):
+        # mark the page being built as depending on more rows
+        if 'cache_tags' in g:
+            g.cache_tags.update(tags)
+
+    def expires(self, when):
+        # the page being built is stale from `when` on, e.g. once the first
+        # of its upcoming shows has started; None leaves it to CACHE_TTL
+        if when is not None and 'cache_expires' in g:
+            g.cache_expires = min(g.cache_expires, when)
+
+    def cached(self, *tags):
+        # tags are formatted with the view arguments, e.g. 'venue:{venue_id}'
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(**kwargs):
+                backend = self.backend
+                if backend is None or request.method != 'GET' or '_flashes' in flask_session:
+                    # pages rendering flashed messages must not be shared
+                    return view(**kwargs)
+
+                key = '{}:{}'.format(request.endpoint, request.full_path)
+                entry = backend.get(key)
+                if entry is not None:
+                    data, status, headers = entry
+                    return Response(data, status, headers)
+
+                generation = backend.generation
+                g.cache_tags = {i.format(**kwargs) for i in tags}
+                g.cache_expires = datetime.now() + timedelta(seconds=current_app.config['CACHE_TTL'])
+                response = make_response(view(**kwargs))
+                ttl = (g.cache_expires - datetime.now()).total_seconds()
+                if response.status_code == 200 and not response.is_streamed and ttl > 0:
+                    value = (response.get_data(), response.status_code, list(response.headers))
+                    backend.set(key, value, frozenset(g.cache_tags), generation, ttl)
+
+                return response
+            return wrapper
+        return decorator
+
+
+def cache_stats():
+    backend = current_app.extensions.get('cache')
+    return jsonify(backend.stats() if backend is not None else {'backend': None})
+
+
+#----------------------------------------------------------------------------#
+# Invalidation.
+#----------------------------------------------------------------------------#
+
+def _tags_for(obj):
+    # e.g. Venue(id=5) -> the venue page, and the listings showing its name
+    if isinstance(obj, Venue):
+        return {'venue:{}'.format(obj.id), 'venues', 'shows'}
+    if isinstance(obj, Artist):
+        return {'artist:{}'.format(obj.id), 'artists', 'shows'}
+    if isinstance(obj, Show):
+        return {'artist:{}'.format(obj.artist_id), 'venue:{}'.format(obj.venue_id), 'venues', 'shows'}
+    return set()
+
+
+def _collect_changes(sess, flush_context):
+    tags = sess.info.setdefault('cache_tags', set())
+    for obj in list(sess.new) + list(sess.dirty) + list(sess.deleted):
+        tags.update(_tags_for(obj))
+
+
+def _apply_changes(sess):
+    tags = sess.info.pop('cache_tags', None)
+    if not tags or not has_app_context():
+        return
+
+    backend = current_app.extensions.get('cache')
+    if backend is not None:
+        backend.invalidate(tags)
+
+
+def _discard_changes(sess, transaction):
+    # rolled back or closed without a commit
+    if transaction.parent is None:
+        sess.info.pop('cache_tags', None)
+
+
+cache = Cache()
@@ -0,0 +1,388 @@
+import csv
+import io
+import json
+
+import click
+
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import func, text
+from sqlalchemy.exc import SQLAlchemyError
+from werkzeug.datastructures import MultiDict
+from werkzeug.utils import import_string
+
+from cache import cache
+from db import session, sqlite_write_lock
+from models.artist import Artist
+from models.genre import Genre, artist_genre, genres_by_name, venue_genre
+from models.show import Show
+from models.venue import Venue
+from geo import location
+from scheduling import ScheduleError, booked_together, conflict_message, conflicting_show, lock_bookings, show_end
+from search import search
+from stats import recount
+
+#----------------------------------------------------------------------------#
+# Bulk import/export.
+#
+# Rows are validated against the same forms as the web handlers (see
+# forms.validate_records), written in chunks with one executemany (or COPY
+# on PostgreSQL) per table per chunk, and exported in id order one chunk at
+# a time. Shows are also checked against the other bookings of their venue
+# and artist (see scheduling.py). A chunk the database refuses is rolled
+# back and its rows reported, and the import goes on with the next one.
+#----------------------------------------------------------------------------#
+
+ENTITIES = {
+    'artists': {
+        'model': Artist,
+        'form': 'forms.ArtistForm',
+        'genres': artist_genre,
+        'columns': ['name', 'city', 'state', 'phone', 'facebook_link', 'image_link',
+                    'website_link', 'seeking_venue', 'seeking_description'],
+    },
+    'venues': {
+        'model': Venue,
+        'form': 'forms.VenueForm',
+        'genres': venue_genre,
+        'columns': ['name', 'city', 'state', 'address', 'phone', 'facebook_link', 'image_link',
+                    'website_link', 'seeking_talent', 'seeking_description'],
+    },
+    'shows': {
+        'model': Show,
+        'form': 'forms.ShowForm',
+        'genres': None,
+        'columns': ['artist_id', 'venue_id', 'start_time', 'end_time'],
+    },
+}
+
+FALSE_STRINGS = ('', '0', 'f', 'false', 'n', 'no', 'off')
+
+
+def file_format(path, fmt):
+    if fmt:
+        return fmt
+    return 'csv' if path.endswith('.csv') else 'jsonl'
+
+
+def read_rows(stream, fmt):
+    # yields (line number, row dict), or (line number, error) for a line
+    # that is not a JSON object
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            # e.g. 'Jazz,Hip-Hop' -> ['Jazz', 'Hip-Hop']
+            if row.get('genres') is not None:
+                row['genres'] = [i.strip() for i in row['genres'].split(',') if i.strip()]
+            yield reader.line_num, row
+    else:
+        for line_num, line in enumerate(stream, 1):
+            if line.strip():
+                try:
+                    row = json.loads(line)
+                except ValueError as e:
+                    yield line_num, e
+                    continue
+                if not isinstance(row, dict):
+                    # e.g. [1, 2]
+                    yield line_num, ValueError('expected an object, got {}'.format(type(row).__name__))
+                    continue
+                yield line_num, row
+
+
+def to_formdata(form_class, row):
+    from wtforms import BooleanField
+
+    formdata = MultiDict()
+    for name, value in row.items():
+        field = getattr(form_class, name, None)
+        if field is None or value is None:
+            continue
+        if field.field_class is BooleanField:
+            if value is True or (isinstance(value, str) and value.strip().lower() not in FALSE_STRINGS):
+                formdata.add(name, 'y')
+        elif isinstance(value, list):
+            for i in value:
+                formdata.add(name, str(i))
+        else:
+            formdata.add(name, str(value))
+    return formdata
+
+
+def validate_row(form_class, row):
+    # -> (form data, None) or (None, ['field: message', ...]); the form's
+    # checks, without building a form per row
+    from forms import record_validator
+
+    data, errors = record_validator(form_class)(to_formdata(form_class, row))
+    if not errors:
+        return data, None
+    return None, ['{}: {}'.format(name, messages[0]) for name, messages in errors.items()]
+
+
+def allocate_ids(table, count):
+    # ids are assigned up front so genre rows can be written with the batch;
+    # without a sequence, the table is locked until the chunk commits so a
+    # concurrent insert cannot take the same ids
+    conn = session.connection()
+    if conn.dialect.name == 'postgresql':
+        return [i for (i,) in conn.execute(
+            text("SELECT nextval(pg_get_serial_sequence(:table, 'id')) FROM generate_series(1, :count)"),
+            {'table': table.name, 'count': count},
+        )]
+    if conn.dialect.name == 'sqlite':
+        sqlite_write_lock(conn, table)
+        start = (session.query(func.max(table.c.id)).scalar() or 0) + 1
+    else:
+        start = (session.query(func.max(table.c.id)).with_for_update().scalar() or 0) + 1
+    return list(range(start, start + count))
+
+
+def copy_field(value):
+    # COPY's CSV format reads an unquoted empty field as NULL and a quoted
+    # one as '', so every value is quoted and only None is left empty, as
+    # executemany stores them; e.g. None -> '', '' -> '""'
+    if value is None:
+        return ''
+    return '"{}"'.format(str(value).replace('"', '""'))
+
+
+def insert_rows(table, rows):
+    conn = session.connection()
+    if conn.dialect.name == 'postgresql' and current_app.config.get('IMPORT_USE_COPY', True):
+        columns = list(rows[0])
+        buffer = io.StringIO()
+        for row in rows:
+            buffer.write(','.join(copy_field(row[i]) for i in columns) + '\n')
+        buffer.seek(0)
+        cursor = conn.connection.cursor()
+        cursor.copy_expert('COPY "{}" ({}) FROM STDIN WITH (FORMAT csv)'.format(
+            table.name, ', '.join(columns)), buffer)
+    else:
+        conn.execute(table.insert(), rows)
+
+
+def write_chunk(entity, chunk):
+    # chunk: [(line number, form data), ...]; returns rejected rows
+    spec = ENTITIES[entity]
+    table = spec['model'].__table__
+    rejected = []
+
+    if entity == 'shows':
+        artist_ids = {data['artist_id'] for _, data in chunk}
+        venue_ids = {data['venue_id'] for _, data in chunk}
+        artist_ids = {i for (i,) in session.query(Artist.id).filter(Artist.id.in_(artist_ids))}
+        venue_ids = {i for (i,) in session.query(Venue.id).filter(Venue.id.in_(venue_ids))}
+        valid = []
+        for line_num, data in chunk:
+            if data['artist_id'] not in artist_ids:
+                rejected.append((line_num, ['artist_id: No artist with this id.']))
+            elif data['venue_id'] not in venue_ids:
+                rejected.append((line_num, ['venue_id: No venue with this id.']))
+            else:
+                lock_bookings(data['artist_id'], data['venue_id'])
+                conflict = conflicting_show(data['artist_id'], data['venue_id'], data['start_time'], data['end_time'])
+                if conflict is not None:
+                    kind, row = conflict
+                    rejected.append((line_num, ['start_time: ' + conflict_message(kind, row.start_time, row.end_time)]))
+                else:
+                    valid.append((line_num, data))
+        # and double bookings within the chunk
+        clashes = dict(booked_together(valid))
+        rejected.extend((line_num, ['start_time: ' + clashes[line_num]]) for line_num, _ in valid if line_num in clashes)
+        rejected.sort(key=lambda i: i[0])
+        chunk = [i for i in valid if i[0] not in clashes]
+
+    if not chunk:
+        return rejected
+
+    rows = [{i: data[i] for i in spec['columns']} for _, data in chunk]
+    if entity == 'venues':
+        # core inserts bypass the session event locating venues
+        for row in rows:
+            row.update(location(row['address'], row['city'], row['state']))
+    if spec['genres'] is not None:
+        for row, id in zip(rows, allocate_ids(table, len(rows))):
+            row['id'] = id
+
+    insert_rows(table, rows)
+
+    if spec['genres'] is not None:
+        genres = genres_by_name(list(dict.fromkeys(name for _, data in chunk for name in data['genres'])))
+        session.flush()
+        genre_ids = {i.name: i.id for i in genres}
+        key = spec['genres'].c[entity[:-1] + '_id']
+        genre_rows = [
+            {key.name: row['id'], 'genre_id': genre_ids[name]}
+            for row, (_, data) in zip(rows, chunk)
+            for name in dict.fromkeys(data['genres'])
+        ]
+        if genre_rows:
+            session.connection().execute(spec['genres'].insert(), genre_rows)
+
+    # core inserts bypass the session events show_stats is kept by
+    if entity == 'shows':
+        recount(session.connection(), 'artist', [row['artist_id'] for row in rows])
+        recount(session.connection(), 'venue', [row['venue_id'] for row in rows])
+    else:
+        recount(session.connection(), entity[:-1], [row['id'] for row in rows])
+
+    versions = None
+    if entity != 'shows':
+        versions = search.backend.bump(session.connection(), spec['model'])
+
+    session.commit()
+    after_import(entity, rows, versions)
+    return rejected
+
+
+def after_import(entity, rows, versions=None):
+    # core inserts bypass the session events search and cache listen to
+    if entity == 'shows':
+        tags = {'shows', 'venues'}
+        for row in rows:
+            tags.update(('artist:{}'.format(row['artist_id']), 'venue:{}'.format(row['venue_id'])))
+    else:
+        search.backend.sync(ENTITIES[entity]['model'], {row['id']: row['name'] for row in rows}, [], versions)
+        tags = {entity}
+
+    if cache.backend is not None:
+        cache.backend.invalidate(tags)
+
+
+def report(path, line_num, messages):
+    for message in messages:
+        click.echo('{}:{}: {}'.format(path, line_num, message), err=True)
+
+
+def import_chunk(entity, chunk, path):
+    # writes the chunk and reports its rejected rows; returns how many
+    try:
+        failed = write_chunk(entity, chunk)
+    except SQLAlchemyError as e:
+        # e.g. a constraint or a lock timeout: none of the chunk was written
+        session.rollback()
+        message = 'database error, chunk not imported: {}'.format(getattr(e, 'orig', None) or e)
+        failed = [(line_num, [message]) for line_num, _ in chunk]
+    for line_num, errors in failed:
+        report(path, line_num, errors)
+    return len(failed)
+
+
+@click.group('catalog')
+def catalog_cli():
+    """Bulk import and export artists, venues and shows."""
+
+
+@catalog_cli.command('import')
+@click.argument('entity', type=click.Choice(list(ENTITIES)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), help='Defaults to the file extension.')
+@click.option('--chunk-size', type=int, help='Rows per insert batch, defaults to IMPORT_CHUNK_SIZE.')
+@with_appcontext
+def import_command(entity, path, fmt, chunk_size):
+    """Load ENTITY rows from a CSV or JSON-lines file."""
+    chunk_size = chunk_size or current_app.config['IMPORT_CHUNK_SIZE']
+    # forms (and WTForms) are only imported by the import command
+    form_class = import_string(ENTITIES[entity]['form'])
+    imported = rejected = 0
+
+    with open(path, newline='') as stream:
+        chunk = []
+        for line_num, row in read_rows(stream, file_format(path, fmt)):
+            if isinstance(row, Exception):
+                report(path, line_num, ['invalid JSON: {}'.format(row)])
+                rejected += 1
+                continue
+
+            data, errors = validate_row(form_class, row)
+            if errors:
+                report(path, line_num, errors)
+                rejected += 1
+                continue
+
+            if entity == 'shows':
+                try:
+                    data['artist_id'] = int(data['artist_id'])
+                    data['venue_id'] = int(data['venue_id'])
+                except ValueError:
+                    report(path, line_num, ['artist_id/venue_id: Not a valid id.'])
+                    rejected += 1
+                    continue
+                try:
+                    data['end_time'] = show_end(data['start_time'], data['end_time'])
+                except ScheduleError as e:
+                    report(path, line_num, ['end_time: {}'.format(e)])
+                    rejected += 1
+                    continue
+            chunk.append((line_num, data))
+
+            if len(chunk) >= chunk_size:
+                failed = import_chunk(entity, chunk, path)
+                imported += len(chunk) - failed
+                rejected += failed
+                chunk = []
+
+        if chunk:
+            failed = import_chunk(entity, chunk, path)
+            imported += len(chunk) - failed
+            rejected += failed
+
+    click.echo('{} {} imported, {} rejected.'.format(imported, entity, rejected))
+
+
+def iter_export_rows(entity, chunk_size):
+    spec = ENTITIES[entity]
+    table = spec['model'].__table__
+    columns = [table.c.id] + [table.c[i] for i in spec['columns']]
+
+    last_id = 0
+    while True:
+        # keyset on id, one bounded query per chunk
+        rows = session.query(*columns).filter(table.c.id > last_id).order_by(table.c.id).limit(chunk_size).all()
+        if not rows:
+            return
+        last_id = rows[-1].id
+
+        genres = {}
+        if spec['genres'] is not None:
+            key = spec['genres'].c[entity[:-1] + '_id']
+            for id, name in session.query(key, Genre.name).join(Genre).filter(
+                    key.in_([i.id for i in rows])).order_by(key, Genre.name):
+                genres.setdefault(id, []).append(name)
+
+        for row in rows:
+            data = row._asdict()
+            if spec['genres'] is not None:
+                data['genres'] = genres.get(row.id, [])
+            if entity == 'shows':
+                # the format ShowForm reads back
+                data['start_time'] = data['start_time'].strftime('%Y-%m-%d %H:%M:%S')
+                data['end_time'] = data['end_time'].strftime('%Y-%m-%d %H:%M:%S')
+            yield data
+
+
+@catalog_cli.command('export')
+@click.argument('entity', type=click.Choice(list(ENTITIES)))
+@click.argument('output', type=click.File('w'), default='-')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), help='Defaults to the file extension, jsonl on stdout.')
+@click.option('--chunk-size', type=int, help='Rows per query, defaults to IMPORT_CHUNK_SIZE.')
+@with_appcontext
+def export_command(entity, output, fmt, chunk_size):
+    """Stream ENTITY rows to OUTPUT as CSV or JSON lines."""
+    chunk_size = chunk_size or current_app.config['IMPORT_CHUNK_SIZE']
+    fmt = file_format(output.name, fmt)
+    rows = iter_export_rows(entity, chunk_size)
+
+    if fmt == 'csv':
+        spec = ENTITIES[entity]
+        fields = ['id'] + spec['columns'] + (['genres'] if spec['genres'] is not None else [])
+        writer = csv.DictWriter(output, fields)
+        writer.writeheader()
+        for row in rows:
+            if 'genres' in row:
+                row['genres'] = ','.join(row['genres'])
+            writer.writerow(row)
+    else:
+        for row in rows:
+            output.write(json.dumps(row) + '\n')
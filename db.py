@@ -1,4 +1,67 @@
-from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy import SignallingSession, SQLAlchemy
+from sqlalchemy import event, orm
+from sqlalchemy.engine import Engine, make_url
 
-db = SQLAlchemy()
+
+class RoutingSession(SignallingSession):
+    # reads go to the engine in info['replica'] while one is set (see
+    # replicas.py); flushes always go to the primary
+    def get_bind(self, mapper=None, clause=None, **kw):
+        replica = self.info.get('replica')
+        if replica is not None and not self._flushing:
+            return replica
+        return super().get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+db = RoutingSQLAlchemy()
 session = db.session
+
+
+@event.listens_for(session, 'before_flush')
+def bump_versions(sess, flush_context, instances):
+    # rows with a `version` column get a new version whenever a column or a
+    # collection (e.g. genres) of theirs changes
+    for obj in sess.dirty:
+        if hasattr(obj, 'version') and sess.is_modified(obj):
+            obj.version = (obj.version or 0) + 1
+
+
+def sqlite_write_lock(conn, table):
+    # SQLite ignores SELECT ... FOR UPDATE; a write matching no rows still
+    # begins the transaction and takes the database's write lock, so other
+    # writers wait until it ends
+    conn.execute(table.update().where(table.c.id == None).values(id=table.c.id))
+
+
+@event.listens_for(Engine, 'connect')
+def enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    # SQLite only enforces foreign keys, and so ON DELETE CASCADE, when asked
+    # to on each connection (sqlite3 and aiosqlite alike)
+    if 'sqlite' in type(dbapi_connection).__module__:
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
+
+
+def engine_options(config):
+    # e.g. {'pool_size': 5, 'max_overflow': 10, ..., 'connect_args': {...}};
+    # SQLite keeps its own pool, which takes no sizing arguments
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    if url.get_backend_name() == 'sqlite':
+        return {'pool_pre_ping': config['DB_POOL_PRE_PING']}
+
+    options = {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+    }
+    if config['DB_STATEMENT_TIMEOUT'] and url.get_backend_name() == 'postgresql':
+        options['connect_args'] = {'options': '-c statement_timeout={:d}'.format(config['DB_STATEMENT_TIMEOUT'])}
+    return options
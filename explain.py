@@ -0,0 +1,104 @@
+import re
+
+import click
+
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import event, func
+
+from db import db, session
+from models.artist import Artist
+from models.venue import Venue
+
+#----------------------------------------------------------------------------#
+# Query plan check.
+#
+# Requests every read route that touches the show table, captures the SQL
+# it actually sends, and EXPLAINs each statement. Any plan that scans the
+# show table sequentially instead of going through an index is reported.
+#----------------------------------------------------------------------------#
+
+SHOW_TABLE = re.compile(r'\bshow\b')
+
+
+def checked_urls(artist_id, venue_id):
+    return [
+        ('GET', '/venues', None),
+        ('POST', '/artists/search', {'search_term': 'a'}),
+        ('POST', '/venues/search', {'search_term': 'a'}),
+        ('GET', '/artists/{}'.format(artist_id), None),
+        ('GET', '/artists/{}/past_shows'.format(artist_id), None),
+        ('GET', '/venues/{}'.format(venue_id), None),
+        ('GET', '/venues/{}/past_shows'.format(venue_id), None),
+        ('GET', '/shows', None),
+    ]
+
+
+def capture_statements(app, urls):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if SHOW_TABLE.search(statement):
+            statements.append((statement, parameters))
+
+    engine = db.get_engine(app)
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        client = app.test_client()
+        for method, url, data in urls:
+            client.open(url, method=method, data=data)
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+    return statements
+
+
+def sequential_scans(conn, statement, parameters):
+    if conn.dialect.name == 'postgresql':
+        plan = [i[0] for i in conn.exec_driver_sql('EXPLAIN ' + statement, parameters)]
+        return [i.strip() for i in plan if 'Seq Scan on show' in i]
+
+    # SQLite: e.g. 'SCAN show' is a full scan, 'SEARCH show USING INDEX ...'
+    # and 'SCAN show USING INDEX ...' are not
+    plan = [i[-1] for i in conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters)]
+    return [i for i in plan if re.match(r'SCAN (TABLE )?show\b', i) and 'INDEX' not in i]
+
+
+def check_query_plans(app):
+    artist_id = session.query(func.min(Artist.id)).scalar()
+    venue_id = session.query(func.min(Venue.id)).scalar()
+    if artist_id is None or venue_id is None:
+        raise click.ClickException('Seed the database with artists, venues and shows first.')
+
+    statements = capture_statements(app, checked_urls(artist_id, venue_id))
+
+    failures = []
+    with db.get_engine(app).begin() as conn:
+        if conn.dialect.name == 'postgresql':
+            # on a small seeded table a sequential scan can be cheaper than
+            # any index, so only let the planner fall back to one when no
+            # usable index exists
+            conn.exec_driver_sql('SET LOCAL enable_seqscan = off')
+        for statement, parameters in statements:
+            scans = sequential_scans(conn, statement, parameters)
+            if scans:
+                failures.append((statement, scans))
+
+    return statements, failures
+
+
+@click.command('explain-check')
+@with_appcontext
+def explain_check_command():
+    """Fail if a read route scans the show table sequentially."""
+    statements, failures = check_query_plans(current_app._get_current_object())
+
+    for statement, scans in failures:
+        click.echo(' '.join(statement.split()), err=True)
+        for scan in scans:
+            click.echo('    ' + scan, err=True)
+
+    if failures:
+        raise click.ClickException('{} of {} statements scan the show table.'.format(len(failures), len(statements)))
+
+    click.echo('{} statements checked, no sequential scans on show.'.format(len(statements)))
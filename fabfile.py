@@ -1,3 +1,5 @@
+import os
+
 from fabric.api import local, settings, abort
 from fabric.contrib.console import confirm
 
@@ -5,12 +7,30 @@ from fabric.contrib.console import confirm
 
 
 def test():
+    command = "python benchmarks/run.py --output bench_output.json"
+    if os.path.exists("bench_baseline.json"):
+        # e.g. a copy of bench_output.json from the last release
+        command += " --compare bench_baseline.json"
+    else:
+        print("No bench_baseline.json, not checking for regressions.")
     with settings(warn_only=True):
-        result = local(
-            "python test_tasks.py -v && python test_users.py -v", capture=True
-        )
+        result = local(command, capture=True)
     if result.failed and not confirm("Tests failed. Continue?"):
         abort("Aborted at user request.")
+    with settings(warn_only=True):
+        result = local("python benchmarks/importtime.py", capture=True)
+    if result.failed and not confirm("Startup over budget. Continue?"):
+        abort("Aborted at user request.")
+    with settings(warn_only=True):
+        result = local("python benchmarks/datetime_filter.py --calls 1000", capture=True)
+    if result.failed and not confirm("Datetime formats differ from Babel. Continue?"):
+        abort("Aborted at user request.")
+
+
+def assets():
+    # checks the build; static/dist is not committed, deploys build their
+    # own (bin/post_compile)
+    local("flask assets build")
 
 
 def commit():
@@ -24,6 +44,7 @@ def push():
 
 def prepare():
     test()
+    assets()
     commit()
     push()
 
@@ -39,14 +60,13 @@ def heroku():
 
 
 def heroku_test():
-    local(
-        "heroku run python test_tasks.py -v && heroku run python test_users.py -v"
-    )
+    local("heroku run flask explain-check")
 
 
 def deploy():
     pull()
     test()
+    assets()
     commit()
     heroku()
     heroku_test()
@@ -0,0 +1,89 @@
+from functools import lru_cache
+
+#----------------------------------------------------------------------------#
+# Datetime formatting.
+#
+# The Jinja `datetime` filter. Templates hand it datetime objects, and the
+# parsed Babel pattern and Locale are built once per (format, locale) rather
+# than on every call. Babel and its locale data are only loaded on the
+# filter's first use, not when the app starts.
+#----------------------------------------------------------------------------#
+
+FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
+
+NAMED_FORMATS = ('full', 'long', 'medium', 'short')
+
+
+class NamedPattern:
+    # A format Babel names, e.g. 'short', not in FORMATS: the locale's date
+    # and time patterns joined by its datetime format, e.g. '{1}, {0}', as
+    # babel.dates.format_datetime does.
+
+    def __init__(self, date_pattern, time_pattern, join):
+        self.date_pattern = date_pattern
+        self.time_pattern = time_pattern
+        self.join = join
+
+    def apply(self, value, locale):
+        return self.join.replace('{0}', self.time_pattern.apply(value, locale)).replace(
+            '{1}', self.date_pattern.apply(value, locale))
+
+
+@lru_cache(maxsize=256)
+def compiled_pattern(format, locale):
+    # e.g. ('full', 'en') -> (DateTimePattern, Locale('en')),
+    # ('short', 'en') -> (NamedPattern, Locale('en'))
+    from babel import Locale
+    from babel.dates import get_date_format, get_datetime_format, get_time_format, parse_pattern
+
+    locale = Locale.parse(locale)
+    if format in FORMATS or format not in NAMED_FORMATS:
+        return parse_pattern(FORMATS.get(format, format)), locale
+    return NamedPattern(
+        get_date_format(format, locale),
+        get_time_format(format, locale),
+        get_datetime_format(format, locale).replace("'", ''),
+    ), locale
+
+
+@lru_cache(maxsize=64)
+def cached_timezone(name):
+    from babel.dates import get_timezone
+
+    return get_timezone(name)
+
+
+class DateTimeFormatter:
+    def __init__(self, locale='en', timezone=None):
+        self.locale = locale
+        self.timezone = timezone
+
+    def __call__(self, value, format='medium', locale=None, tzinfo=None):
+        if isinstance(value, str):
+            # strings still work, but cost a parse per call
+            import dateutil.parser
+
+            value = dateutil.parser.parse(value)
+
+        if value.tzinfo is None:
+            # naive values are stored as UTC, as Babel assumes
+            value = value.replace(tzinfo=cached_timezone('UTC'))
+        tzinfo = tzinfo or self.timezone
+        if tzinfo is not None:
+            if isinstance(tzinfo, str):
+                tzinfo = cached_timezone(tzinfo)
+            value = value.astimezone(tzinfo)
+
+        pattern, locale = compiled_pattern(format, locale or self.locale)
+        return pattern.apply(value, locale)
+
+
+def init_app(app):
+    app.jinja_env.filters['datetime'] = DateTimeFormatter(
+        locale=app.config.get('DATETIME_LOCALE', 'en'),
+        timezone=app.config.get('DATETIME_TIMEZONE'),
+    )
@@ -3,8 +3,11 @@ import re
 from datetime import datetime
 from enum import Enum
 from flask_wtf import Form
+from markupsafe import Markup
 from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField
-from wtforms.validators import DataRequired, AnyOf, URL , Regexp, ValidationError
+from wtforms.fields.core import UnboundField
+from wtforms.validators import DataRequired, AnyOf, Optional, URL , Regexp, StopValidation, ValidationError
+from wtforms.widgets import Select, html_params
 
 STATE_CHOICES = [
     ('AL', 'AL'),
@@ -81,6 +84,65 @@ GENRE_CHOICES = [
     ('Other', 'Other'),
 ]
 
+#----------------------------------------------------------------------------#
+# Static choice fields.
+#
+# STATE_CHOICES and GENRE_CHOICES never change, so their <option> markup is
+# rendered once per list and only picked between selected and unselected on
+# each render, and validating a choice is a set lookup.
+#----------------------------------------------------------------------------#
+
+_choices = {}
+
+
+def static_choices(choices):
+    # -> (frozenset of values, [(value, <option>, <option selected>), ...])
+    cached = _choices.get(id(choices))
+    if cached is None or cached[0] is not choices:
+        options = [(value, Select.render_option(value, label, False), Select.render_option(value, label, True))
+                   for value, label in choices]
+        cached = _choices[id(choices)] = (choices, frozenset(i[0] for i in options), options)
+    return cached[1], cached[2]
+
+
+class StaticSelect(Select):
+    def __call__(self, field, **kwargs):
+        kwargs.setdefault('id', field.id)
+        if self.multiple:
+            kwargs['multiple'] = True
+        if 'required' not in kwargs and 'required' in getattr(field, 'flags', []):
+            kwargs['required'] = True
+        selected = field.selected_values()
+        html = ['<select %s>' % html_params(name=field.name, **kwargs)]
+        html.extend(on if value in selected else off for value, off, on in static_choices(field.choices)[1])
+        html.append('</select>')
+        return Markup(''.join(html))
+
+
+class StaticSelectField(SelectField):
+    widget = StaticSelect()
+
+    def selected_values(self):
+        return {self.data}
+
+    def pre_validate(self, form):
+        if self.validate_choice and self.data not in static_choices(self.choices)[0]:
+            raise ValueError(self.gettext('Not a valid choice'))
+
+
+class StaticSelectMultipleField(SelectMultipleField):
+    widget = StaticSelect(multiple=True)
+
+    def selected_values(self):
+        return set(self.data or ())
+
+    def pre_validate(self, form):
+        values = static_choices(self.choices)[0]
+        for i in self.data or ():
+            if i not in values:
+                raise ValueError(self.gettext("'%(value)s' is not a valid choice for this field") % dict(value=i))
+
+
 class ShowForm(Form):
     class Meta:
         csrf = False  # Disable CSRF
@@ -98,6 +160,11 @@ class ShowForm(Form):
         validators=[DataRequired()],
         default= datetime.today()
     )
+    # SHOW_DEFAULT_DURATION after start_time when left empty
+    end_time = DateTimeField(
+        'end_time',
+        validators=[Optional()],
+    )
 
 class VenueForm(Form):
     class Meta:
@@ -109,7 +176,7 @@ class VenueForm(Form):
     city = StringField(
         'city', validators=[DataRequired()]
     )
-    state = SelectField(
+    state = StaticSelectField(
         'state', validators=[DataRequired()],
         choices=STATE_CHOICES
     )
@@ -123,7 +190,7 @@ class VenueForm(Form):
     image_link = StringField(
         'image_link'
     )
-    genres = SelectMultipleField(
+    genres = StaticSelectMultipleField(
         'genres', validators=[DataRequired()],
         choices=GENRE_CHOICES
     )
@@ -150,7 +217,7 @@ class ArtistForm(Form):
     city = StringField(
         'city', validators=[DataRequired()]
     )
-    state = SelectField(
+    state = StaticSelectField(
         'state', validators=[DataRequired()],
         choices=STATE_CHOICES
     )
@@ -161,7 +228,7 @@ class ArtistForm(Form):
     image_link = StringField(
         'image_link'
     )
-    genres = SelectMultipleField(
+    genres = StaticSelectMultipleField(
         'genres', validators=[DataRequired()],
         choices=GENRE_CHOICES
     )
@@ -177,3 +244,165 @@ class ArtistForm(Form):
     seeking_description = StringField(
         'seeking_description'
     )
+
+
+#----------------------------------------------------------------------------#
+# Batch validation.
+#
+# Validates records (form data, e.g. a MultiDict per imported row) the way
+# form_class(formdata=record).validate() would, with the same data and the
+# same messages, but from a schema compiled once per form class instead of
+# building and binding a form per record. Field classes outside FIELD_KINDS
+# are not supported.
+#----------------------------------------------------------------------------#
+
+FIELD_KINDS = [
+    (StaticSelectMultipleField, 'select_multiple'),
+    (SelectMultipleField, 'select_multiple'),
+    (SelectField, 'select'),
+    (BooleanField, 'boolean'),
+    (DateTimeField, 'datetime'),
+    (StringField, 'string'),
+]
+
+
+class RecordField:
+    # what validators read and write of a field
+    __slots__ = ('data', 'raw_data', 'errors')
+
+    def __init__(self, data, raw_data):
+        self.data = data
+        self.raw_data = raw_data
+        self.errors = []
+
+    @staticmethod
+    def gettext(string):
+        return string
+
+    @staticmethod
+    def ngettext(singular, plural, n):
+        return singular if n == 1 else plural
+
+
+class RecordValidator:
+    def __init__(self, form_class):
+        unbound = [(name, getattr(form_class, name)) for name in dir(form_class)
+                   if not name.startswith('_') and isinstance(getattr(form_class, name), UnboundField)]
+        # in declaration order, as form.errors and form.data are
+        unbound.sort(key=lambda i: (i[1].creation_counter, i[0]))
+
+        self.fields = []
+        for name, field in unbound:
+            if hasattr(form_class, 'validate_' + name):
+                raise TypeError('{}.validate_{} needs a form instance.'.format(form_class.__name__, name))
+            kind = next((kind for cls, kind in FIELD_KINDS if issubclass(field.field_class, cls)), None)
+            if kind is None:
+                raise TypeError('{} is not supported by batch validation.'.format(field.field_class.__name__))
+
+            kwargs = field.kwargs
+            if kwargs.get('filters'):
+                raise TypeError('{}.{} has filters, not supported by batch validation.'.format(form_class.__name__, name))
+            spec = {
+                'kind': kind,
+                'default': kwargs.get('default'),
+                'validators': list(kwargs.get('validators') or ()),
+                'coerce': kwargs.get('coerce', str),
+            }
+            if kind in ('select', 'select_multiple'):
+                spec['choices'] = frozenset(i[0] for i in kwargs.get('choices') or ())
+                spec['validate_choice'] = kwargs.get('validate_choice', True)
+            elif kind == 'boolean':
+                spec['false_values'] = kwargs.get('false_values') or BooleanField.false_values
+            elif kind == 'datetime':
+                spec['format'] = kwargs.get('format', '%Y-%m-%d %H:%M:%S')
+            self.fields.append((name, spec))
+
+    def process(self, spec, raw):
+        # -> (data, process error or None), as Field.process with formdata
+        default = spec['default']
+        data = default() if callable(default) else default
+        kind = spec['kind']
+        if kind == 'boolean':
+            data = bool(data)
+
+        if kind == 'string':
+            if raw:
+                data = raw[0]
+            elif data is None:
+                data = ''
+        elif kind == 'select':
+            if raw:
+                try:
+                    data = spec['coerce'](raw[0])
+                except ValueError:
+                    return data, 'Invalid Choice: could not coerce'
+        elif kind == 'select_multiple':
+            try:
+                data = [spec['coerce'](i) for i in raw]
+            except ValueError:
+                return data, 'Invalid choice(s): one or more data inputs could not be coerced'
+        elif kind == 'boolean':
+            data = not (not raw or raw[0] in spec['false_values'])
+        elif kind == 'datetime':
+            if raw:
+                try:
+                    data = datetime.strptime(' '.join(raw), spec['format'])
+                except ValueError:
+                    return None, 'Not a valid datetime value'
+        return data, None
+
+    def pre_validate(self, spec, data):
+        if spec['kind'] == 'select':
+            if spec['validate_choice'] and data not in spec['choices']:
+                return 'Not a valid choice'
+        elif spec['kind'] == 'select_multiple':
+            for i in data or ():
+                if i not in spec['choices']:
+                    return "'%(value)s' is not a valid choice for this field" % dict(value=i)
+        return None
+
+    def __call__(self, record):
+        # -> (data, errors), e.g. ({'name': 'The Band', ...}, {'phone': ['Invalid phone number format.']})
+        data, errors = {}, {}
+        for name, spec in self.fields:
+            raw = record.getlist(name) if name in record else []
+            value, process_error = self.process(spec, raw)
+            field = RecordField(value, raw)
+            if process_error:
+                field.errors.append(process_error)
+
+            # a failed choice check does not stop the validators, as in Field.validate
+            pre_error = self.pre_validate(spec, value)
+            if pre_error:
+                field.errors.append(pre_error)
+            for validator in spec['validators']:
+                try:
+                    validator(None, field)
+                except StopValidation as e:
+                    if e.args and e.args[0]:
+                        field.errors.append(e.args[0])
+                    break
+                except ValueError as e:
+                    field.errors.append(e.args[0])
+
+            data[name] = field.data
+            if field.errors:
+                errors[name] = field.errors
+        return data, errors
+
+
+_record_validators = {}
+
+
+def record_validator(form_class):
+    validator = _record_validators.get(form_class)
+    if validator is None:
+        validator = _record_validators[form_class] = RecordValidator(form_class)
+    return validator
+
+
+def validate_records(form_class, records):
+    # e.g. for data, errors in validate_records(ArtistForm, rows): ...
+    validator = record_validator(form_class)
+    for record in records:
+        yield validator(record)
@@ -0,0 +1,292 @@
+import csv
+import math
+
+import click
+
+from flask import current_app, has_app_context
+from flask.cli import with_appcontext
+from sqlalchemy import event, or_
+from sqlalchemy.orm import attributes
+from werkzeug.utils import import_string
+
+from db import session
+from models.venue import Venue
+
+#----------------------------------------------------------------------------#
+# Venue locations.
+#
+# A venue gets its latitude and longitude from the GEOCODER when it is
+# created or its address changes. It also gets a geocell: the geohash of the
+# point at PRECISION characters (about 5 m across) as an integer. Every
+# shorter geohash is then one range of the indexed geocell column. A radius
+# or box search reads the few cells covering its box (at most MAX_CELLS index
+# ranges), then keeps the venues that are actually inside, nearest first.
+# This needs no PostGIS and works the same on every engine.
+#----------------------------------------------------------------------------#
+
+PRECISION = 9
+MAX_CELLS = 16
+EARTH_RADIUS_KM = 6371.0088
+ADDRESS_FIELDS = ('address', 'city', 'state')
+
+
+class Geocoder:
+    # Interface for geocoding backends: (latitude, longitude) of a venue's
+    # address, or None when it cannot be located.
+
+    def geocode(self, address, city, state):
+        raise NotImplementedError
+
+
+def normalized(value):
+    # e.g. ' 1015  Folsom Street' -> '1015 folsom street'
+    return ' '.join((value or '').lower().split())
+
+
+class CSVGeocoder(Geocoder):
+    # Offline, from a CSV file of address,city,state,latitude,longitude rows.
+    # A row without an address stands for its whole city and locates the
+    # city's addresses that have no row of their own. Loaded on first use.
+
+    def __init__(self, path):
+        self.path = path
+        self.points = None
+
+    def load(self):
+        points = {}
+        with open(self.path, newline='') as f:
+            for row in csv.DictReader(f):
+                key = (normalized(row['address']), normalized(row['city']), normalized(row['state']))
+                points[key] = (float(row['latitude']), float(row['longitude']))
+        return points
+
+    def geocode(self, address, city, state):
+        if self.points is None:
+            self.points = self.load()
+        city, state = normalized(city), normalized(state)
+        return self.points.get((normalized(address), city, state)) or self.points.get(('', city, state))
+
+
+BACKENDS = {
+    'csv': lambda app: CSVGeocoder(app.config['GEOCODER_CSV']),
+}
+
+
+#----------------------------------------------------------------------------#
+# Geohash cells.
+#----------------------------------------------------------------------------#
+
+def cell_bits(precision):
+    # (longitude bits, latitude bits) of a geohash, longitude first
+    bits = 5 * precision
+    return (bits + 1) // 2, bits // 2
+
+
+def interleave(x, y, precision):
+    lng_bits, lat_bits = cell_bits(precision)
+    value = 0
+    for i in range(5 * precision):
+        if i % 2 == 0:
+            bit = (x >> (lng_bits - 1 - i // 2)) & 1
+        else:
+            bit = (y >> (lat_bits - 1 - i // 2)) & 1
+        value = value << 1 | bit
+    return value
+
+
+def grid(latitude, longitude, precision):
+    # (column, row) of the point in the grid of geohashes of that length
+    lng_bits, lat_bits = cell_bits(precision)
+    x = min(int((longitude + 180) / 360 * (1 << lng_bits)), (1 << lng_bits) - 1)
+    y = min(int((latitude + 90) / 180 * (1 << lat_bits)), (1 << lat_bits) - 1)
+    return x, y
+
+
+def cell(latitude, longitude, precision=PRECISION):
+    # e.g. (41.8781, -87.6298) -> the bits of geohash 'dp3wjztvt'
+    return interleave(*grid(latitude, longitude, precision), precision)
+
+
+def cover(box):
+    # box: (min lat, min lng, max lat, max lng), min lng > max lng when it
+    # crosses the antimeridian; -> merged inclusive geocell ranges
+    min_lat, min_lng, max_lat, max_lng = box
+    for precision in range(PRECISION, 0, -1):
+        size = 1 << cell_bits(precision)[0]
+        x0, y0 = grid(min_lat, min_lng, precision)
+        x1, y1 = grid(max_lat, max_lng, precision)
+        if min_lng <= max_lng:
+            columns = x1 - x0 + 1
+        else:
+            columns = min(x1 + size - x0 + 1, size)
+        if columns * (y1 - y0 + 1) <= MAX_CELLS or precision == 1:
+            break
+
+    shift = 5 * (PRECISION - precision)
+    ranges = sorted(
+        (value << shift, ((value + 1) << shift) - 1)
+        for value in (interleave(x % size, y, precision) for x in range(x0, x0 + columns) for y in range(y0, y1 + 1))
+    )
+    merged = [ranges[0]]
+    for low, high in ranges[1:]:
+        if low == merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], high)
+        else:
+            merged.append((low, high))
+    return merged
+
+
+def cell_filter(box):
+    # the venues in the cells covering the box, a superset of those inside
+    return or_(*(Venue.geocell.between(low, high) for low, high in cover(box)))
+
+
+#----------------------------------------------------------------------------#
+# Distances and boxes.
+#----------------------------------------------------------------------------#
+
+def distance_km(lat1, lng1, lat2, lng2):
+    # haversine
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1, math.sqrt(a)))
+
+
+def wrap(longitude):
+    # e.g. 190 -> -170
+    return (longitude + 180) % 360 - 180
+
+
+def box_around(latitude, longitude, radius_km):
+    # the smallest box holding the circle
+    angle = radius_km / EARTH_RADIUS_KM
+    min_lat = latitude - math.degrees(angle)
+    max_lat = latitude + math.degrees(angle)
+    if min_lat <= -90 or max_lat >= 90:
+        # the circle holds a pole
+        return max(min_lat, -90), -180, min(max_lat, 90), 180
+    spread = math.sin(angle) / math.cos(math.radians(latitude))
+    if spread >= 1:
+        return min_lat, -180, max_lat, 180
+    delta = math.degrees(math.asin(spread))
+    if delta >= 180:
+        return min_lat, -180, max_lat, 180
+    return min_lat, wrap(longitude - delta), max_lat, wrap(longitude + delta)
+
+
+def in_box(latitude, longitude, box):
+    min_lat, min_lng, max_lat, max_lng = box
+    if not min_lat <= latitude <= max_lat:
+        return False
+    if min_lng <= max_lng:
+        return min_lng <= longitude <= max_lng
+    return longitude >= min_lng or longitude <= max_lng
+
+
+def box_center(box):
+    min_lat, min_lng, max_lat, max_lng = box
+    if min_lng > max_lng:
+        max_lng += 360
+    return (min_lat + max_lat) / 2, wrap((min_lng + max_lng) / 2)
+
+
+def nearest(rows, latitude, longitude, radius_km=None, box=None, limit=None):
+    # rows with latitude and longitude columns, e.g. those of cell_filter;
+    # -> [(distance km, row)] inside the box and the radius, nearest first
+    found = []
+    for row in rows:
+        if box is not None and not in_box(row.latitude, row.longitude, box):
+            continue
+        distance = distance_km(latitude, longitude, row.latitude, row.longitude)
+        if radius_km is None or distance <= radius_km:
+            found.append((distance, row))
+    found.sort(key=lambda i: (i[0], i[1].id))
+    return found[:limit]
+
+
+#----------------------------------------------------------------------------#
+# Geocoding.
+#----------------------------------------------------------------------------#
+
+def location(address, city, state):
+    # e.g. {'latitude': 37.7786, 'longitude': -122.4056, 'geocell': ...},
+    # all None when the address cannot be located or there is no geocoder
+    geocoder = current_app.extensions.get('geo')
+    point = geocoder.geocode(address, city, state) if geocoder is not None else None
+    if point is None:
+        return {'latitude': None, 'longitude': None, 'geocell': None}
+    return {'latitude': point[0], 'longitude': point[1], 'geocell': cell(*point)}
+
+
+def locate(venue):
+    for name, value in location(venue.address, venue.city, venue.state).items():
+        setattr(venue, name, value)
+
+
+def _locate_venues(sess, flush_context, instances):
+    # venues created, or whose address changed, in this flush
+    if not has_app_context() or current_app.extensions.get('geo') is None:
+        return
+    for obj in list(sess.new) + list(sess.dirty):
+        if not isinstance(obj, Venue):
+            continue
+        if obj in sess.new or any(attributes.get_history(obj, i).has_changes() for i in ADDRESS_FIELDS):
+            locate(obj)
+
+
+@click.group('geo')
+def geo_cli():
+    """Locate venues."""
+
+
+@geo_cli.command('locate')
+@click.option('--all', 'everything', is_flag=True, help='Locate every venue again, not only those without a location.')
+@click.option('--chunk-size', type=int, help='Venues per transaction, defaults to IMPORT_CHUNK_SIZE.')
+@with_appcontext
+def locate_command(everything, chunk_size):
+    """Geocode venues, e.g. after an upgrade or a new GEOCODER."""
+    chunk_size = chunk_size or current_app.config['IMPORT_CHUNK_SIZE']
+    located = missing = last_id = 0
+    while True:
+        query = Venue.query.filter(Venue.id > last_id)
+        if not everything:
+            query = query.filter(Venue.latitude == None)
+        venues = query.order_by(Venue.id).limit(chunk_size).all()
+        if not venues:
+            break
+        last_id = venues[-1].id
+        for venue in venues:
+            locate(venue)
+            if venue.latitude is None:
+                missing += 1
+            else:
+                located += 1
+        session.commit()
+    click.echo('{} venues located, {} not found.'.format(located, missing))
+
+
+class Geo:
+    def __init__(self, app=None):
+        self._listening = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        name = app.config.get('GEOCODER', 'csv')
+        if not name:
+            geocoder = None
+        elif name in BACKENDS:
+            geocoder = BACKENDS[name](app)
+        else:
+            # e.g. 'myproject.geocoding:NominatimGeocoder'
+            geocoder = import_string(name)(app)
+
+        app.extensions['geo'] = geocoder
+        app.cli.add_command(geo_cli)
+
+        if not self._listening:
+            event.listen(session, 'before_flush', _locate_venues)
+            self._listening = True
+
+
+geo = Geo()
@@ -0,0 +1,25 @@
+import os
+
+# gunicorn 'app:create_app()' -c gunicorn.conf.py
+#
+# Every worker holds its own pool of DB_POOL_SIZE + DB_MAX_OVERFLOW
+# connections, so workers * that stays under the database's max_connections.
+# All workers must share SECRET_KEY (FYYUR_CONFIG=production enforces it).
+
+bind = '0.0.0.0:{}'.format(os.environ.get('PORT', 5000))
+workers = int(os.environ.get('WEB_CONCURRENCY', 2 * os.cpu_count() + 1))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+# engines are created lazily in each worker, so the app is not preloaded
+# and no connection is shared across a fork
+preload_app = False
+
+raw_env = ['FYYUR_CONFIG={}'.format(os.environ.get('FYYUR_CONFIG', 'production'))]
+
+
+def post_worker_init(worker):
+    # load every template before the worker serves (see templating.py)
+    import templating
+
+    app = worker.wsgi
+    # asgi:create_asgi_app() wraps the Flask app
+    templating.start_worker(getattr(app, 'app', app))
@@ -0,0 +1,94 @@
+import uuid
+
+from datetime import datetime, timedelta
+
+import click
+
+from flask import current_app, request
+from flask.cli import with_appcontext
+from sqlalchemy.exc import IntegrityError
+from werkzeug.exceptions import abort
+
+from db import session
+from models.idempotency_key import IdempotencyKey
+
+#----------------------------------------------------------------------------#
+# Idempotent creates.
+#
+# A create request may carry a key, the Idempotency-Key header or the
+# create forms' hidden idempotency_key field. The key is stored with the id
+# of the row it created, in the same transaction, so a retry of the request
+# gets that id back instead of creating a duplicate. Two requests with the
+# same key racing each other both insert; the key's primary key lets one
+# commit and the other roll back and return the winner's id.
+#----------------------------------------------------------------------------#
+
+KEY_HEADER = 'Idempotency-Key'
+KEY_FIELD = 'idempotency_key'
+KEY_MAX_LENGTH = 120
+
+
+def new_key():
+    # e.g. the hidden field of a create form, one per rendered form
+    return uuid.uuid4().hex
+
+
+def request_key():
+    key = request.headers.get(KEY_HEADER) or request.form.get(KEY_FIELD)
+    if not key:
+        return None
+    if len(key) > KEY_MAX_LENGTH:
+        abort(400)
+    return key
+
+
+def created_id(kind, key):
+    return session.query(IdempotencyKey.entity_id).filter_by(kind=kind, key=key).scalar()
+
+
+def create_once(kind, key, create):
+    # `create` adds the new row, flushes it and returns its primary key;
+    # returns that id after the commit, or the id created earlier under `key`
+    if key is not None:
+        id = created_id(kind, key)
+        if id is not None:
+            return id
+
+    try:
+        id = create()
+        if key is not None:
+            session.add(IdempotencyKey(kind=kind, key=key, entity_id=id))
+            session.flush()
+        session.commit()
+        return id
+
+    except IntegrityError:
+        session.rollback()
+        if key is not None:
+            # a concurrent request with the same key committed first
+            id = created_id(kind, key)
+            if id is not None:
+                return id
+        raise
+
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+@click.group('idempotency-keys')
+def idempotency_cli():
+    """Maintain the stored idempotency keys."""
+
+
+@idempotency_cli.command('purge')
+@with_appcontext
+def purge_command():
+    """Delete keys older than IDEMPOTENCY_KEY_TTL seconds.
+
+    Run it periodically, e.g. daily from cron.
+    """
+    cutoff = datetime.now() - timedelta(seconds=current_app.config['IDEMPOTENCY_KEY_TTL'])
+    count = session.query(IdempotencyKey).filter(IdempotencyKey.created_at < cutoff).delete(synchronize_session=False)
+    session.commit()
+    click.echo('{} keys purged.'.format(count))
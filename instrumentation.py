@@ -0,0 +1,124 @@
+import re
+import time
+
+from collections import Counter
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+#----------------------------------------------------------------------------#
+# Per-request SQL instrumentation.
+#
+# Every statement run while handling a request is counted and timed. The
+# totals go out in a Server-Timing header and the log, and a request that
+# runs the same statement (up to its parameters) too often is flagged as a
+# likely N+1 pattern, or rejected outright in strict mode.
+#----------------------------------------------------------------------------#
+
+
+class NPlusOneError(Exception):
+    pass
+
+
+class RequestStats:
+    def __init__(self):
+        self.statements = 0
+        self.duration = 0.0
+        self.rows = 0
+        self.by_statement = Counter()
+
+
+# e.g. 'IN (?, ?, ?)' -> 'IN (?)', "name = 'x'" -> 'name = ?'
+IN_LIST = re.compile(r'\bIN \((?:[^()]|\([^()]*\))*\)', re.IGNORECASE)
+LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+WHITESPACE = re.compile(r'\s+')
+
+
+def normalize(statement):
+    statement = IN_LIST.sub('IN (?)', statement)
+    statement = LITERAL.sub('?', statement)
+    return WHITESPACE.sub(' ', statement).strip()
+
+
+def request_stats():
+    if has_request_context():
+        return g.get('sql_stats')
+    return None
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = request_stats()
+    if stats is None:
+        return
+
+    stats.statements += 1
+    key = normalize(statement)
+    stats.by_statement[key] += 1
+
+    config = current_app.config
+    if stats.by_statement[key] == config['SQL_NPLUSONE_THRESHOLD'] + 1 and config['SQL_NPLUSONE_STRICT']:
+        raise NPlusOneError('{} {} ran this statement more than {} times: {}'.format(
+            request.method, request.path, config['SQL_NPLUSONE_THRESHOLD'], key))
+
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = request_stats()
+    if stats is None or not conn.info.get('query_start'):
+        return
+
+    stats.duration += time.perf_counter() - conn.info['query_start'].pop()
+    # drivers that buffer results (psycopg2) report the rows of a SELECT,
+    # others (sqlite3) report -1 until everything is fetched
+    if cursor.rowcount > 0:
+        stats.rows += cursor.rowcount
+
+
+def start_request():
+    g.sql_stats = RequestStats()
+
+
+def finish_request(response):
+    stats = g.pop('sql_stats', None)
+    if stats is None:
+        return response
+
+    response.headers.add('Server-Timing', 'db;dur={:.1f};desc="{} queries, {} rows"'.format(
+        stats.duration * 1000, stats.statements, stats.rows))
+    current_app.logger.info('%s %s: %d queries, %.1f ms db, %d rows', request.method,
+                            request.path, stats.statements, stats.duration * 1000, stats.rows)
+
+    threshold = current_app.config['SQL_NPLUSONE_THRESHOLD']
+    for statement, count in stats.by_statement.items():
+        if count > threshold:
+            current_app.logger.warning('Possible N+1: %s %s ran %d times: %s', request.method,
+                                       request.path, count, statement)
+
+    return response
+
+
+class SQLInstrumentation:
+    def __init__(self, app=None):
+        self._listening = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SQL_INSTRUMENTATION', True)
+        app.config.setdefault('SQL_NPLUSONE_THRESHOLD', 10)
+        app.config.setdefault('SQL_NPLUSONE_STRICT', False)
+        if not app.config['SQL_INSTRUMENTATION']:
+            return
+
+        app.before_request(start_request)
+        app.after_request(finish_request)
+
+        if not self._listening:
+            # every engine db.py creates, including any binds
+            event.listen(Engine, 'before_cursor_execute', before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', after_cursor_execute)
+            self._listening = True
+
+
+instrumentation = SQLInstrumentation()
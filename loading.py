@@ -0,0 +1,32 @@
+from flask import current_app
+from sqlalchemy.orm import joinedload, lazyload, raiseload, selectinload
+
+#----------------------------------------------------------------------------#
+# Relationship loading per use case.
+#
+# LOADING_STRATEGIES maps a use case to the strategy of each relationship,
+# e.g. {'detail': {'genres': 'selectin', '*': 'raise'}}; '*' covers every
+# relationship not named. 'raise' turns an accidental lazy load into an
+# error instead of a query per object.
+#----------------------------------------------------------------------------#
+
+STRATEGIES = {
+    'selectin': selectinload,
+    'joined': joinedload,
+    'lazy': lazyload,
+    'raise': raiseload,
+}
+
+
+def load_options(model, use_case):
+    # e.g. Artist.query.options(*load_options(Artist, 'detail'))
+    options = []
+    for name, strategy in current_app.config['LOADING_STRATEGIES'][use_case].items():
+        if name == '*':
+            continue
+        options.append(STRATEGIES[strategy](getattr(model, name)))
+
+    default = current_app.config['LOADING_STRATEGIES'][use_case].get('*')
+    if default is not None:
+        options.append(STRATEGIES[default]('*'))
+    return options
@@ -0,0 +1,36 @@
+"""trigram indexes for artist and venue name search
+
+Revision ID: 4e7a1c9b2f60
+Revises: bc31edc235ab
+Create Date: 2026-10-18 09:12:41.507214
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4e7a1c9b2f60'
+down_revision = 'bc31edc235ab'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # pg_trgm is PostgreSQL only, other engines use the in-process index
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index('ix_artist_name_trgm', 'artist', ['name'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+    op.create_index('ix_venue_name_trgm', 'venue', ['name'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.drop_index('ix_venue_name_trgm', table_name='venue')
+    op.drop_index('ix_artist_name_trgm', table_name='artist')
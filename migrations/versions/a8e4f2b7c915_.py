@@ -0,0 +1,42 @@
+"""ON DELETE CASCADE from artist and venue to their shows and genre links
+
+Revision ID: a8e4f2b7c915
+Revises: 3f6d9a1c5e82
+Create Date: 2026-10-18 17:12:40.580364
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a8e4f2b7c915'
+down_revision = '3f6d9a1c5e82'
+branch_labels = None
+depends_on = None
+
+# (table, column, referred table)
+FOREIGN_KEYS = [
+    ('show', 'artist_id', 'artist'),
+    ('show', 'venue_id', 'venue'),
+    ('artist_genre', 'artist_id', 'artist'),
+    ('venue_genre', 'venue_id', 'venue'),
+]
+# PostgreSQL's default constraint names, also given to SQLite's unnamed ones
+NAMING_CONVENTION = {'fk': '%(table_name)s_%(column_0_name)s_fkey'}
+
+
+def replace_foreign_keys(ondelete):
+    for table, column, referred in FOREIGN_KEYS:
+        name = '{}_{}_fkey'.format(table, column)
+        with op.batch_alter_table(table, naming_convention=NAMING_CONVENTION) as batch_op:
+            batch_op.drop_constraint(name, type_='foreignkey')
+            batch_op.create_foreign_key(name, referred, [column], ['id'], ondelete=ondelete)
+
+
+def upgrade():
+    replace_foreign_keys('CASCADE')
+
+
+def downgrade():
+    replace_foreign_keys(None)
@@ -0,0 +1,82 @@
+"""show end times and double booking constraints
+
+Revision ID: c6e1f4a8d293
+Revises: b52d7e3a9f18
+Create Date: 2026-10-18 20:37:15.804129
+
+"""
+from datetime import timedelta
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c6e1f4a8d293'
+down_revision = 'b52d7e3a9f18'
+branch_labels = None
+depends_on = None
+
+# config.SHOW_DEFAULT_DURATION when this revision was written
+DEFAULT_DURATION = timedelta(minutes=120)
+CHUNK_SIZE = 10000
+# models.show.EXCLUSION_CONSTRAINTS
+EXCLUSION_CONSTRAINTS = {
+    'venue_id': 'ex_show_venue_id_time',
+    'artist_id': 'ex_show_artist_id_time',
+}
+
+
+def upgrade():
+    op.add_column('show', sa.Column('end_time', sa.DateTime(), nullable=True))
+
+    conn = op.get_bind()
+    show = sa.table('show', sa.column('id', sa.Integer), sa.column('start_time', sa.DateTime), sa.column('end_time', sa.DateTime))
+    if conn.dialect.name == 'postgresql':
+        conn.execute(show.update().values(end_time=show.c.start_time + DEFAULT_DURATION))
+    else:
+        # no portable date arithmetic, computed here one chunk at a time
+        last_id = 0
+        while True:
+            rows = conn.execute(sa.select(show.c.id, show.c.start_time).where(
+                show.c.id > last_id).order_by(show.c.id).limit(CHUNK_SIZE)).fetchall()
+            if not rows:
+                break
+            conn.execute(
+                show.update().where(show.c.id == sa.bindparam('show_id')).values(end_time=sa.bindparam('end')),
+                [{'show_id': id, 'end': start_time + DEFAULT_DURATION} for id, start_time in rows],
+            )
+            last_id = rows[-1].id
+
+    # existing double bookings end where the venue's (then the artist's)
+    # next show starts, shows starting together ending at once
+    for column in EXCLUSION_CONSTRAINTS:
+        op.execute(
+            'UPDATE "show" SET end_time = following.next_start FROM ('
+            'SELECT id, lead(start_time) OVER (PARTITION BY {} ORDER BY start_time, id) AS next_start FROM "show"'
+            ') AS following WHERE "show".id = following.id AND following.next_start < "show".end_time'.format(column)
+        )
+
+    with op.batch_alter_table('show') as batch_op:
+        batch_op.alter_column('end_time', existing_type=sa.DateTime(), nullable=False)
+
+    # the exclusion constraints are PostgreSQL only, other engines rely on
+    # the check before each booking
+    if conn.dialect.name != 'postgresql':
+        return
+
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    for column, name in EXCLUSION_CONSTRAINTS.items():
+        op.execute(
+            'ALTER TABLE "show" ADD CONSTRAINT {} EXCLUDE USING gist '
+            '({} WITH =, tsrange(start_time, end_time) WITH &&)'.format(name, column)
+        )
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        for name in EXCLUSION_CONSTRAINTS.values():
+            op.execute('ALTER TABLE "show" DROP CONSTRAINT {}'.format(name))
+
+    with op.batch_alter_table('show') as batch_op:
+        batch_op.drop_column('end_time')
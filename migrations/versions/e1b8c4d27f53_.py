@@ -0,0 +1,119 @@
+"""normalize genres into genre, artist_genre and venue_genre
+
+Revision ID: e1b8c4d27f53
+Revises: 9d2f6b3e8a17
+Create Date: 2026-10-18 12:41:09.338125
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e1b8c4d27f53'
+down_revision = '9d2f6b3e8a17'
+branch_labels = None
+depends_on = None
+
+# forms.GENRE_CHOICES when this revision was written
+GENRES = [
+    'Alternative', 'Blues', 'Classical', 'Country', 'Electronic', 'Folk',
+    'Funk', 'Hip-Hop', 'Heavy Metal', 'Instrumental', 'Jazz',
+    'Musical Theatre', 'Pop', 'Punk', 'R&B', 'Reggae', 'Rock n Roll', 'Soul',
+    'Other',
+]
+
+
+def parse_genres(value):
+    # e.g. '{Classical,"Heavy Metal",R&B}' -> ['Classical', 'Heavy Metal', 'R&B']
+    if not value:
+        return []
+    return [i.strip().strip('"') for i in value.strip('{}').split(',') if i.strip()]
+
+
+def format_genres(names):
+    # e.g. ['Classical', 'Heavy Metal'] -> '{Classical,"Heavy Metal"}'
+    return '{' + ','.join('"{}"'.format(i) if ' ' in i else i for i in names) + '}'
+
+
+def upgrade():
+    genre = op.create_table('genre',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=120), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    op.create_table('artist_genre',
+    sa.Column('artist_id', sa.Integer(), nullable=False),
+    sa.Column('genre_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['artist_id'], ['artist.id'], ),
+    sa.ForeignKeyConstraint(['genre_id'], ['genre.id'], ),
+    sa.PrimaryKeyConstraint('artist_id', 'genre_id')
+    )
+    op.create_index('ix_artist_genre_genre_id_artist_id', 'artist_genre', ['genre_id', 'artist_id'], unique=False)
+    op.create_table('venue_genre',
+    sa.Column('venue_id', sa.Integer(), nullable=False),
+    sa.Column('genre_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['genre_id'], ['genre.id'], ),
+    sa.ForeignKeyConstraint(['venue_id'], ['venue.id'], ),
+    sa.PrimaryKeyConstraint('venue_id', 'genre_id')
+    )
+    op.create_index('ix_venue_genre_genre_id_venue_id', 'venue_genre', ['genre_id', 'venue_id'], unique=False)
+
+    # move the array literals into the association tables
+    conn = op.get_bind()
+    rows = {
+        'artist': conn.execute(sa.text('SELECT id, genres FROM artist')).fetchall(),
+        'venue': conn.execute(sa.text('SELECT id, genres FROM venue')).fetchall(),
+    }
+
+    names = list(GENRES)
+    for table_rows in rows.values():
+        for _, value in table_rows:
+            names.extend(i for i in parse_genres(value) if i not in names)
+    op.bulk_insert(genre, [{'id': i + 1, 'name': name} for i, name in enumerate(names)])
+    genre_ids = {name: i + 1 for i, name in enumerate(names)}
+
+    for table, table_rows in rows.items():
+        association = sa.table(table + '_genre', sa.column(table + '_id'), sa.column('genre_id'))
+        op.bulk_insert(association, [
+            {table + '_id': id, 'genre_id': genre_ids[name]}
+            for id, value in table_rows
+            for name in dict.fromkeys(parse_genres(value))
+        ])
+
+    if conn.dialect.name == 'postgresql':
+        # ids were inserted explicitly, move the sequence past them
+        op.execute("SELECT setval('genre_id_seq', (SELECT max(id) FROM genre))")
+
+    with op.batch_alter_table('artist') as batch_op:
+        batch_op.drop_column('genres')
+    with op.batch_alter_table('venue') as batch_op:
+        batch_op.drop_column('genres')
+
+
+def downgrade():
+    with op.batch_alter_table('venue') as batch_op:
+        batch_op.add_column(sa.Column('genres', sa.String(length=120), nullable=True))
+    with op.batch_alter_table('artist') as batch_op:
+        batch_op.add_column(sa.Column('genres', sa.String(length=120), nullable=True))
+
+    conn = op.get_bind()
+    for table in ('artist', 'venue'):
+        genres = {}
+        for id, name in conn.execute(sa.text(
+            'SELECT {0}_genre.{0}_id, genre.name FROM {0}_genre '
+            'JOIN genre ON genre.id = {0}_genre.genre_id ORDER BY genre.name'.format(table)
+        )):
+            genres.setdefault(id, []).append(name)
+        for id, names in genres.items():
+            conn.execute(
+                sa.text('UPDATE {} SET genres = :genres WHERE id = :id'.format(table)),
+                {'genres': format_genres(names), 'id': id},
+            )
+
+    op.drop_index('ix_venue_genre_genre_id_venue_id', table_name='venue_genre')
+    op.drop_table('venue_genre')
+    op.drop_index('ix_artist_genre_genre_id_artist_id', table_name='artist_genre')
+    op.drop_table('artist_genre')
+    op.drop_table('genre')
@@ -1,21 +1,31 @@
 from db import db
+from models.genre import artist_genre
 
 class Artist(db.Model):
         __tablename__ = 'artist'
+        __table_args__ = (
+                # pg_trgm index backing the case-insensitive name search
+                db.Index('ix_artist_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+        )
 
         id = db.Column(db.Integer, primary_key=True)
         name = db.Column(db.String, nullable=False)
         city = db.Column(db.String(120))
         state = db.Column(db.String(120))
         phone = db.Column(db.String(120))
-        genres = db.Column(db.String(120))
         facebook_link = db.Column(db.String(120))
         image_link = db.Column(db.String(500))
         website_link = db.Column(db.String(120))
         seeking_venue = db.Column(db.Boolean, default=False)
         seeking_description = db.Column(db.String(500))
+        # bumped on every update (see db.py), the basis of the API's ETags
+        version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
 
-        shows = db.relationship('Show', backref='artist', lazy=True)
+        # deletes leave the shows and genre links to ON DELETE CASCADE, rather
+        # than loading them first; shows are never loaded as a collection
+        # (see loading.py for the strategies per use case)
+        genres = db.relationship('Genre', secondary=artist_genre, order_by='Genre.name', lazy=True, passive_deletes=True)
+        shows = db.relationship('Show', backref='artist', lazy='raise', cascade='all, delete', passive_deletes=True)
 
         def __repr__(self):
                 return f'id={self.id}, name={self.name}'
@@ -0,0 +1,37 @@
+from db import db
+
+# artist <-> genre; the (genre_id, artist_id) index answers "artists by genre"
+artist_genre = db.Table('artist_genre',
+        db.Column('artist_id', db.Integer, db.ForeignKey('artist.id', ondelete='CASCADE'), primary_key=True),
+        db.Column('genre_id', db.Integer, db.ForeignKey('genre.id'), primary_key=True),
+        db.Index('ix_artist_genre_genre_id_artist_id', 'genre_id', 'artist_id'),
+)
+
+# venue <-> genre; the (genre_id, venue_id) index answers "venues by genre"
+venue_genre = db.Table('venue_genre',
+        db.Column('venue_id', db.Integer, db.ForeignKey('venue.id', ondelete='CASCADE'), primary_key=True),
+        db.Column('genre_id', db.Integer, db.ForeignKey('genre.id'), primary_key=True),
+        db.Index('ix_venue_genre_genre_id_venue_id', 'genre_id', 'venue_id'),
+)
+
+class Genre(db.Model):
+        __tablename__ = 'genre'
+
+        id = db.Column(db.Integer, primary_key=True)
+        name = db.Column(db.String(120), nullable=False, unique=True)
+
+        def __repr__(self):
+                return f'id={self.id}, name={self.name}'
+
+
+def genres_by_name(names):
+        # e.g. ['Jazz', 'R&B'] -> [Genre(Jazz), Genre(R&B)], adding unknown names
+        genres = Genre.query.filter(Genre.name.in_(names)).all()
+        known = {i.name for i in genres}
+        for name in names:
+                if name not in known:
+                        genre = Genre(name=name)
+                        db.session.add(genre)
+                        genres.append(genre)
+                        known.add(name)
+        return genres
@@ -0,0 +1,21 @@
+from datetime import datetime
+
+from db import db
+
+class IdempotencyKey(db.Model):
+        # a create request's client-chosen key and the row it created, so a
+        # retried request redirects to that row instead of creating another
+        __tablename__ = 'idempotency_key'
+        __table_args__ = (
+                # `flask idempotency-keys purge`: keys older than the TTL
+                db.Index('ix_idempotency_key_created_at', 'created_at'),
+        )
+
+        # e.g. ('artist', '6f1c2a9e-...')
+        kind = db.Column(db.String(6), primary_key=True)
+        key = db.Column(db.String(120), primary_key=True)
+        entity_id = db.Column(db.Integer, nullable=False)
+        created_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+
+        def __repr__(self):
+                return f'{self.kind}={self.entity_id}, key={self.key}'
@@ -0,0 +1,14 @@
+from db import db
+
+class SearchVersion(db.Model):
+        # one row per searchable table, bumped by search.py in the same
+        # transaction as every change to its names, so each process can tell
+        # whether its in-memory name index is still current
+        __tablename__ = 'search_version'
+
+        # e.g. 'artist'
+        model = db.Column(db.String(32), primary_key=True)
+        version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+        def __repr__(self):
+                return f'{self.model}={self.version}'
@@ -1,12 +1,44 @@
 from db import db
+from sqlalchemy import DDL, event
+
+# e.g. {'venue_id': 'ex_show_venue_id_time'}: PostgreSQL refuses two shows of
+# one venue, or of one artist, whose [start_time, end_time) ranges overlap
+EXCLUSION_CONSTRAINTS = {
+        'venue_id': 'ex_show_venue_id_time',
+        'artist_id': 'ex_show_artist_id_time',
+}
 
 class Show(db.Model):
         __tablename__ = 'show'
+        __table_args__ = (
+                # artist/venue pages, search counts and booking conflicts
+                # (see scheduling.py): shows of one artist or venue within a
+                # start_time range
+                db.Index('ix_show_artist_id_start_time', 'artist_id', 'start_time'),
+                db.Index('ix_show_venue_id_start_time', 'venue_id', 'start_time'),
+                # /shows keyset pagination
+                db.Index('ix_show_start_time_id', 'start_time', 'id'),
+        )
 
         id = db.Column(db.Integer, primary_key=True)
-        artist_id = db.Column(db.Integer, db.ForeignKey('artist.id'), nullable=False)
-        venue_id = db.Column(db.Integer, db.ForeignKey('venue.id'), nullable=False)
+        # deleting an artist or venue deletes its shows in the database
+        artist_id = db.Column(db.Integer, db.ForeignKey('artist.id', ondelete='CASCADE'), nullable=False)
+        venue_id = db.Column(db.Integer, db.ForeignKey('venue.id', ondelete='CASCADE'), nullable=False)
         start_time = db.Column(db.DateTime, nullable=False)
+        # exclusive; at most scheduling.MAX_DURATION after start_time
+        end_time = db.Column(db.DateTime, nullable=False)
+        # bumped on every update (see db.py), the basis of the API's ETags
+        version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
 
         def __repr__(self):
                 return f'id={self.id}, artist={self.artist_id}, venue={self.venue_id}'
+
+
+# the exclusion constraints are PostgreSQL only (and need btree_gist for the
+# integer column); the migration adds them to existing databases
+event.listen(Show.__table__, 'before_create', DDL(
+        'CREATE EXTENSION IF NOT EXISTS btree_gist').execute_if(dialect='postgresql'))
+for column, name in EXCLUSION_CONSTRAINTS.items():
+        event.listen(Show.__table__, 'after_create', DDL(
+                'ALTER TABLE "show" ADD CONSTRAINT {} EXCLUDE USING gist '
+                '({} WITH =, tsrange(start_time, end_time) WITH &&)'.format(name, column)).execute_if(dialect='postgresql'))
@@ -0,0 +1,21 @@
+from db import db
+
+class ShowStats(db.Model):
+        # one row per artist and per venue, kept up to date by stats.py
+        __tablename__ = 'show_stats'
+        __table_args__ = (
+                # `flask show-stats roll`: rows whose next show has started
+                db.Index('ix_show_stats_next_show_time', 'next_show_time'),
+        )
+
+        # e.g. ('venue', 5)
+        kind = db.Column(db.String(6), primary_key=True)
+        entity_id = db.Column(db.Integer, primary_key=True)
+        upcoming_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+        past_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+        # earliest upcoming show; once it has started the counts are stale
+        # until the next roll-forward, and readers count that row live
+        next_show_time = db.Column(db.DateTime)
+
+        def __repr__(self):
+                return f'{self.kind}={self.entity_id}, upcoming={self.upcoming_count}, past={self.past_count}'
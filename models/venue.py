@@ -1,7 +1,14 @@
 from db import db
+from models.genre import venue_genre
 
 class Venue(db.Model):
         __tablename__ = 'venue'
+        __table_args__ = (
+                # pg_trgm index backing the case-insensitive name search
+                db.Index('ix_venue_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+                # radius and box searches: one range per geohash cell (see geo.py)
+                db.Index('ix_venue_geocell', 'geocell'),
+        )
 
         id = db.Column(db.Integer, primary_key=True)
         name = db.Column(db.String, nullable=False)
@@ -9,14 +16,24 @@ class Venue(db.Model):
         state = db.Column(db.String(120), nullable=False)
         address = db.Column(db.String(120), nullable=False)
         phone = db.Column(db.String(120), nullable=False)
-        genres = db.Column(db.String(120))
         facebook_link = db.Column(db.String(120))
         image_link = db.Column(db.String(500))
         website_link = db.Column(db.String(120))
         seeking_talent = db.Column(db.Boolean, default=False)
         seeking_description = db.Column(db.String(500))
+        # from the geocoder, None until located; geocell is the geohash of the
+        # point as an integer (see geo.py)
+        latitude = db.Column(db.Float)
+        longitude = db.Column(db.Float)
+        geocell = db.Column(db.BigInteger)
+        # bumped on every update (see db.py), the basis of the API's ETags
+        version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
 
-        shows = db.relationship('Show', backref='venue', lazy=True)
+        # deletes leave the shows and genre links to ON DELETE CASCADE, rather
+        # than loading them first; shows are never loaded as a collection
+        # (see loading.py for the strategies per use case)
+        genres = db.relationship('Genre', secondary=venue_genre, order_by='Genre.name', lazy=True, passive_deletes=True)
+        shows = db.relationship('Show', backref='venue', lazy='raise', cascade='all, delete', passive_deletes=True)
 
         def __repr__(self):
                 return f'id={self.id}, name={self.name}'
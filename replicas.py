@@ -0,0 +1,93 @@
+import random
+import time
+
+from flask import current_app, has_request_context, request, session as flask_session
+from sqlalchemy import event
+
+from db import db, session
+
+#----------------------------------------------------------------------------#
+# Read replicas.
+#
+# GET and HEAD requests read from one of the replica binds, picked per
+# request. Writes go to the primary, and so does every request of a client
+# for a few seconds after it committed one, so the page it is redirected to
+# shows its own change even while the replicas lag behind.
+#----------------------------------------------------------------------------#
+
+READ_METHODS = ('GET', 'HEAD')
+
+
+def primary(view):
+    # e.g. edit forms, whose values are saved straight back
+    view.use_primary = True
+    return view
+
+
+def reads_from_replica():
+    if not current_app.extensions.get('replicas') or request.method not in READ_METHODS:
+        return False
+    if getattr(current_app.view_functions.get(request.endpoint), 'use_primary', False):
+        return False
+    return flask_session.get('primary_until', 0) <= time.time()
+
+
+def choose_replica():
+    if not reads_from_replica():
+        return
+
+    key = random.choice(current_app.extensions['replicas'])
+    session.info['replica'] = db.get_engine(current_app, bind=key)
+
+
+def _mark_write(sess, flush_context):
+    # the rest of the request reads what it just wrote
+    sess.info.pop('replica', None)
+    sess.info['wrote'] = True
+
+
+def _pin_to_primary(sess):
+    if not sess.info.pop('wrote', False) or not has_request_context():
+        return
+    if current_app.extensions.get('replicas'):
+        flask_session['primary_until'] = time.time() + current_app.config['REPLICA_STICKY_SECONDS']
+
+
+def _discard_write(sess, transaction):
+    if transaction.parent is None:
+        sess.info.pop('wrote', None)
+
+
+class Replicas:
+    def __init__(self, app=None):
+        self._listening = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SQLALCHEMY_REPLICA_URIS', [])
+        app.config.setdefault('REPLICA_STICKY_SECONDS', 5)
+
+        # e.g. ['sqlite:///replica.db'] -> SQLALCHEMY_BINDS['replica_0']
+        binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+        keys = []
+        for i, uri in enumerate(app.config['SQLALCHEMY_REPLICA_URIS']):
+            key = 'replica_{}'.format(i)
+            binds[key] = uri
+            keys.append(key)
+
+        app.extensions['replicas'] = keys
+        if not keys:
+            return
+
+        app.config['SQLALCHEMY_BINDS'] = binds
+        app.before_request(choose_replica)
+
+        if not self._listening:
+            event.listen(session, 'after_flush', _mark_write)
+            event.listen(session, 'after_commit', _pin_to_primary)
+            event.listen(session, 'after_transaction_end', _discard_write)
+            self._listening = True
+
+
+replicas = Replicas()
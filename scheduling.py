@@ -0,0 +1,116 @@
+from datetime import timedelta
+
+from flask import current_app
+
+from db import session, sqlite_write_lock
+from models.artist import Artist
+from models.show import EXCLUSION_CONSTRAINTS, Show
+from models.venue import Venue
+
+#----------------------------------------------------------------------------#
+# Show scheduling.
+#
+# A show books its venue and its artist from start_time up to end_time, and
+# no two shows of a venue or of an artist may overlap. Each booking is
+# checked first (conflicting_show). Shows never run longer than MAX_DURATION,
+# so only the shows starting in a window of the new one's length plus
+# MAX_DURATION can overlap it. The check is a short range scan of the
+# (venue_id, start_time) and (artist_id, start_time) indexes, however many
+# past shows the venue or artist has. Two bookings racing past the check are
+# caught by PostgreSQL's exclusion constraints (see models/show.py). SQLite
+# has no such constraints and ignores SELECT ... FOR UPDATE, so a booking
+# takes the database's write lock before its check instead: a concurrent
+# booking waits for it to commit, then sees its show. Other engines lock the
+# artist and venue rows for the check. benchmarks/booking_concurrency.py
+# books the same venue and artist from many threads at once.
+#----------------------------------------------------------------------------#
+
+MAX_DURATION = timedelta(hours=24)
+
+
+class ScheduleError(ValueError):
+    pass
+
+
+class ShowConflict(ScheduleError):
+    pass
+
+
+def show_end(start_time, end_time=None):
+    # e.g. (datetime(2023, 4, 12, 21, 0), None) -> datetime(2023, 4, 12, 23, 0)
+    # with the default SHOW_DEFAULT_DURATION of 120 minutes
+    if end_time is None:
+        end_time = start_time + timedelta(minutes=current_app.config['SHOW_DEFAULT_DURATION'])
+    if end_time <= start_time:
+        raise ScheduleError('The show must end after it starts.')
+    if end_time - start_time > MAX_DURATION:
+        raise ScheduleError('A show can last at most {} hours.'.format(MAX_DURATION // timedelta(hours=1)))
+    return end_time
+
+
+def overlapping(column, value, start_time, end_time):
+    # shows of one venue or artist overlapping [start_time, end_time); the
+    # lower start_time bound keeps the index range short
+    return session.query(Show.id, Show.start_time, Show.end_time).filter(
+        column == value,
+        Show.start_time > start_time - MAX_DURATION,
+        Show.start_time < end_time,
+        Show.end_time > start_time,
+    ).order_by(Show.start_time)
+
+
+def conflicting_show(artist_id, venue_id, start_time, end_time):
+    # -> ('venue' or 'artist', row) of the first show in the way, or None
+    for kind, column, value in (('venue', Show.venue_id, venue_id), ('artist', Show.artist_id, artist_id)):
+        row = overlapping(column, value, start_time, end_time).first()
+        if row is not None:
+            return kind, row
+    return None
+
+
+def conflict_message(kind, start_time, end_time):
+    return 'The {} is already booked from {:%Y-%m-%d %H:%M} to {:%Y-%m-%d %H:%M}.'.format(kind, start_time, end_time)
+
+
+def lock_bookings(artist_id, venue_id):
+    dialect = session.connection().dialect.name
+    if dialect == 'postgresql':
+        return
+    if dialect == 'sqlite':
+        sqlite_write_lock(session.connection(), Artist.__table__)
+        return
+    # always artist first, so two bookings cannot deadlock
+    session.query(Artist.id).filter(Artist.id == artist_id).with_for_update().first()
+    session.query(Venue.id).filter(Venue.id == venue_id).with_for_update().first()
+
+
+def check_booking(artist_id, venue_id, start_time, end_time):
+    lock_bookings(artist_id, venue_id)
+    conflict = conflicting_show(artist_id, venue_id, start_time, end_time)
+    if conflict is not None:
+        kind, row = conflict
+        raise ShowConflict(conflict_message(kind, row.start_time, row.end_time))
+
+
+def is_conflict(error):
+    # an IntegrityError raised by one of the exclusion constraints
+    diag = getattr(error.orig, 'diag', None)
+    return getattr(diag, 'constraint_name', None) in EXCLUSION_CONSTRAINTS.values()
+
+
+def booked_together(rows):
+    # rows: [(line number, {'artist_id', 'venue_id', 'start_time', 'end_time'})];
+    # yields (line number, message) for the rows overlapping an earlier one
+    # of the same rows, e.g. one import batch
+    booked = {}
+    for line_num, row in rows:
+        keys = [('venue', row['venue_id']), ('artist', row['artist_id'])]
+        for kind, id in keys:
+            clash = next((i for i in booked.get((kind, id), ())
+                          if i[0] < row['end_time'] and i[1] > row['start_time']), None)
+            if clash is not None:
+                yield line_num, conflict_message(kind, *clash)
+                break
+        else:
+            for key in keys:
+                booked.setdefault(key, []).append((row['start_time'], row['end_time']))
@@ -0,0 +1,285 @@
+import string
+import threading
+
+from collections import defaultdict
+from flask import current_app, has_app_context, request
+from sqlalchemy import event, select
+from sqlalchemy.engine.url import make_url
+from werkzeug.exceptions import abort
+
+from db import session
+from models.artist import Artist
+from models.search_version import SearchVersion
+from models.venue import Venue
+
+#----------------------------------------------------------------------------#
+# Name search backends.
+#
+# Both backends answer "which rows have `term` somewhere in their name,
+# case-insensitively" with the same results as `name ILIKE '%term%'`.
+#
+# The ngram backend keeps its index in each process. Every change to the
+# names bumps the table's row in search_version in the same transaction, and
+# a search first reads that version: an index built at another version (e.g.
+# another worker wrote since) is read fresh from the table. Like SQLite's
+# LIKE it folds ASCII letters only, and it leaves the terms its index cannot
+# narrow down (shorter than a trigram, or in too many names) to ILIKE.
+#----------------------------------------------------------------------------#
+
+SEARCHABLE_MODELS = (Artist, Venue)
+
+# characters with a special meaning inside an ILIKE pattern
+LIKE_WILDCARDS = ('%', '_', '\\')
+# candidates above which an ngram search is left to ILIKE rather than sent
+# as one bound parameter per id
+MAX_CANDIDATES = 500
+ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+def fold(text):
+    # e.g. 'ÉCOLE Rock' -> 'École rock', as SQLite's LIKE compares them
+    return text.translate(ASCII_LOWER)
+
+
+def ilike_filter(model, term):
+    return model.name.ilike('%{}%'.format(term))
+
+
+def search_page():
+    # (limit, offset) of an artist or venue search, the limit clamped to
+    # SEARCH_MAX_PAGE_SIZE; anything but non-negative integers is a 400
+    max_limit = current_app.config['SEARCH_MAX_PAGE_SIZE']
+    try:
+        limit = int(request.values.get('limit', max_limit))
+        offset = int(request.values.get('offset', 0))
+    except ValueError:
+        abort(400)
+    if limit < 1 or offset < 0:
+        abort(400)
+    return min(limit, max_limit), offset
+
+
+class TrigramSearchBackend:
+    # PostgreSQL: the pg_trgm GIN indexes on artist.name and venue.name let
+    # the planner answer a leading-wildcard ILIKE without a sequential scan,
+    # so the filter itself stays a plain ILIKE.
+    name = 'trigram'
+
+    def name_filter(self, model, term):
+        return ilike_filter(model, term)
+
+    def build(self):
+        pass
+
+    def bump(self, conn, model):
+        return None
+
+    def sync(self, model, added, removed, versions=None):
+        pass
+
+
+class NgramIndex:
+    def __init__(self, n=3, version=None):
+        self.n = n
+        # search_version of the table when the index was read from it
+        self.version = version
+        self.names = {}
+        self.postings = defaultdict(set)
+        self.lock = threading.Lock()
+
+    def grams(self, text):
+        return {text[i:i + self.n] for i in range(len(text) - self.n + 1)}
+
+    def add(self, id, name):
+        with self.lock:
+            self._remove(id)
+            self.names[id] = fold(name)
+            for gram in self.grams(self.names[id]):
+                self.postings[gram].add(id)
+
+    def remove(self, id):
+        with self.lock:
+            self._remove(id)
+
+    def _remove(self, id):
+        name = self.names.pop(id, None)
+        if name is None:
+            return
+        for gram in self.grams(name):
+            ids = self.postings.get(gram)
+            if ids is not None:
+                ids.discard(id)
+                if not ids:
+                    del self.postings[gram]
+
+    def search(self, term):
+        term = fold(term)
+        with self.lock:
+            grams = self.grams(term)
+            if grams:
+                # intersect the shortest posting lists first
+                postings = sorted((self.postings.get(g, ()) for g in grams), key=len)
+                candidates = set(postings[0]).intersection(*postings[1:])
+            else:
+                candidates = list(self.names)
+
+            # trigrams can match out of order, so confirm the substring
+            return sorted(i for i in candidates if term in self.names[i])
+
+
+class NgramSearchBackend:
+    # Any other engine (e.g. SQLite): an in-process inverted index of name
+    # trigrams per model, built lazily from the table, kept in sync from this
+    # process's commits and rebuilt when search_version shows other writes.
+    name = 'ngram'
+
+    def __init__(self, n=3):
+        self.n = n
+        self.indexes = {}
+
+    def version(self, model):
+        return session.query(SearchVersion.version).filter(
+            SearchVersion.model == model.__tablename__).scalar() or 0
+
+    def index_for(self, model):
+        version = self.version(model)
+        index = self.indexes.get(model)
+        if index is None or index.version != version:
+            # no lock held while reading, which may yield to other requests
+            # in async mode; names committed after `version` was read only
+            # make the next search read them again
+            index = NgramIndex(self.n, version)
+            for id, name in session.query(model.id, model.name):
+                index.add(id, name)
+            self.indexes[model] = index
+        return index
+
+    def build(self):
+        # e.g. before serving requests that must not wait on the first build
+        for model in SEARCHABLE_MODELS:
+            self.index_for(model)
+
+    def name_filter(self, model, term):
+        if any(c in term for c in LIKE_WILDCARDS) or len(term) < self.n:
+            # wildcard patterns are left to the database to interpret, and
+            # terms shorter than a trigram would match every name
+            return ilike_filter(model, term)
+
+        ids = self.index_for(model).search(term)
+        if len(ids) > MAX_CANDIDATES:
+            return ilike_filter(model, term)
+        return model.id.in_(ids)
+
+    def bump(self, conn, model):
+        # within the writing transaction; -> (version before, version after)
+        table = SearchVersion.__table__
+        criterion = table.c.model == model.__tablename__
+        result = conn.execute(table.update().where(criterion).values(version=table.c.version + 1))
+        if result.rowcount == 0:
+            conn.execute(table.insert().values(model=model.__tablename__, version=1))
+        version = conn.execute(select(table.c.version).where(criterion)).scalar()
+        return version - 1, version
+
+    def sync(self, model, added, removed, versions=None):
+        # versions: (before, after) the transaction that made the changes
+        index = self.indexes.get(model)
+        if index is None:
+            # not built yet, it will be read fresh from the table
+            return
+        if versions is None or index.version != versions[0]:
+            # the index missed other writes too; read it again on next use
+            self.indexes.pop(model, None)
+            return
+        for id in removed:
+            index.remove(id)
+        for id, name in added.items():
+            index.add(id, name)
+        index.version = versions[1]
+
+
+BACKENDS = {
+    TrigramSearchBackend.name: TrigramSearchBackend,
+    NgramSearchBackend.name: NgramSearchBackend,
+}
+
+
+class Search:
+    def __init__(self, app=None):
+        self._listening = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        name = app.config.get('SEARCH_BACKEND')
+        if name is None:
+            dialect = make_url(app.config['SQLALCHEMY_DATABASE_URI']).get_backend_name()
+            name = 'trigram' if dialect == 'postgresql' else 'ngram'
+
+        app.extensions['search'] = BACKENDS[name]()
+
+        if not self._listening:
+            event.listen(session, 'after_flush', _collect_changes)
+            event.listen(session, 'after_commit', _apply_changes)
+            event.listen(session, 'after_transaction_end', _discard_changes)
+            self._listening = True
+
+    @property
+    def backend(self):
+        return current_app.extensions['search']
+
+    def name_filter(self, model, term):
+        return self.backend.name_filter(model, term)
+
+
+#----------------------------------------------------------------------------#
+# Index maintenance.
+#----------------------------------------------------------------------------#
+
+def _collect_changes(sess, flush_context):
+    changes = sess.info.setdefault('search_changes', {})
+    changed = set()
+    for obj in list(sess.new) + list(sess.dirty):
+        if isinstance(obj, SEARCHABLE_MODELS):
+            changes[(type(obj), obj.id)] = obj.name
+            changed.add(type(obj))
+    for obj in sess.deleted:
+        if isinstance(obj, SEARCHABLE_MODELS):
+            changes[(type(obj), obj.id)] = None
+            changed.add(type(obj))
+
+    backend = current_app.extensions.get('search') if has_app_context() else None
+    if backend is None:
+        return
+    versions = sess.info.setdefault('search_versions', {})
+    for model in changed:
+        bumped = backend.bump(sess.connection(), model)
+        if bumped is not None:
+            # from before the transaction's first flush to after its last
+            versions[model] = (versions.get(model, bumped)[0], bumped[1])
+
+
+def _apply_changes(sess):
+    changes = sess.info.pop('search_changes', None)
+    versions = sess.info.pop('search_versions', {})
+    if not changes or not has_app_context():
+        return
+
+    backend = current_app.extensions.get('search')
+    if backend is None:
+        return
+
+    for model in SEARCHABLE_MODELS:
+        added = {id: name for (m, id), name in changes.items() if m is model and name is not None}
+        removed = [id for (m, id), name in changes.items() if m is model and name is None]
+        if added or removed:
+            backend.sync(model, added, removed, versions.get(model))
+
+
+def _discard_changes(sess, transaction):
+    # rolled back or closed without a commit
+    if transaction.parent is None:
+        sess.info.pop('search_changes', None)
+        sess.info.pop('search_versions', None)
+
+
+search = Search()
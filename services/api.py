@@ -0,0 +1,319 @@
+import hashlib
+
+from datetime import datetime
+from flask import Blueprint, current_app, jsonify, make_response, request
+from sqlalchemy import func
+from werkzeug.exceptions import abort
+
+from db import session
+from geo import box_around, box_center, cell_filter, distance_km, nearest
+from models.artist import Artist
+from models.genre import Genre, artist_genre, venue_genre
+from models.show import Show
+from models.venue import Venue
+from services.show import decode_cursor, shows_page, shows_query
+
+bp = Blueprint('api', __name__, url_prefix='/api/v1')
+
+ARTIST_FIELDS = (
+    'id', 'name', 'city', 'state', 'phone', 'genres', 'facebook_link',
+    'image_link', 'website_link', 'seeking_venue', 'seeking_description',
+)
+VENUE_FIELDS = (
+    'id', 'name', 'city', 'state', 'address', 'phone', 'genres', 'facebook_link',
+    'image_link', 'website_link', 'seeking_talent', 'seeking_description',
+    'latitude', 'longitude',
+)
+SHOW_FIELDS = (
+    'id', 'venue_id', 'venue_name', 'artist_id', 'artist_name',
+    'artist_image_link', 'start_time', 'end_time',
+)
+
+
+def api_error(status, message):
+    abort(make_response(jsonify({'error': message}), status))
+
+
+def requested_fields(allowed):
+    # e.g. ?fields=id,name -> ('id', 'name')
+    fields = request.args.get('fields')
+    if not fields:
+        return allowed
+    fields = tuple(dict.fromkeys(i.strip() for i in fields.split(',') if i.strip()))
+    unknown = [i for i in fields if i not in allowed]
+    if unknown:
+        api_error(400, 'Unknown fields: {}'.format(', '.join(unknown)))
+    return fields
+
+
+def page_limit():
+    limit = request.args.get('limit', current_app.config['API_PAGE_SIZE'], type=int)
+    if limit < 1:
+        api_error(400, 'limit must be positive.')
+    return min(limit, current_app.config['API_MAX_PAGE_SIZE'])
+
+
+def conditional_response(versions, build):
+    # strong ETag over the requested representation and the versions of
+    # every row in it; a match answers 304 before anything is serialized
+    etag = hashlib.sha1(repr((request.full_path, versions)).encode()).hexdigest()
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = jsonify(build())
+    response.set_etag(etag)
+    return response
+
+
+#----------------------------------------------------------------------------#
+# Artists and venues.
+#----------------------------------------------------------------------------#
+
+def entity_query(model, fields):
+    # only the requested columns are read
+    table = model.__table__
+    columns = [table.c[i] for i in fields if i not in ('id', 'genres')]
+    return session.query(table.c.id, table.c.version, *columns)
+
+
+def genre_names(genre_table, key, ids):
+    genres = {}
+    for id, name in session.query(genre_table.c[key], Genre.name).join(Genre).filter(
+            genre_table.c[key].in_(ids)).order_by(genre_table.c[key], Genre.name):
+        genres.setdefault(id, []).append(name)
+    return genres
+
+
+def entity_data(rows, fields, genre_table, key):
+    genres = genre_names(genre_table, key, [i.id for i in rows]) if 'genres' in fields else {}
+    data = []
+    for row in rows:
+        values = row._asdict()
+        values['genres'] = genres.get(row.id, [])
+        data.append({i: values[i] for i in fields})
+    return data
+
+
+def entity_list(model, allowed, genre_table, key):
+    fields = requested_fields(allowed)
+    limit = page_limit()
+    query = entity_query(model, fields).order_by(model.id)
+    after = request.args.get('after', type=int)
+    if after is not None:
+        query = query.filter(model.id > after)
+    rows = query.limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = str(rows[-1].id)
+
+    return conditional_response(
+        [(i.id, i.version) for i in rows],
+        lambda: {'data': entity_data(rows, fields, genre_table, key), 'next_cursor': next_cursor},
+    )
+
+
+def entity_detail(model, allowed, genre_table, key, id):
+    fields = requested_fields(allowed)
+    row = entity_query(model, fields).filter(model.id == id).first()
+    if row is None:
+        api_error(404, 'Not found.')
+
+    return conditional_response(
+        [(row.id, row.version)],
+        lambda: {'data': entity_data([row], fields, genre_table, key)[0]},
+    )
+
+
+@bp.route('/artists')
+def artists():
+    return entity_list(Artist, ARTIST_FIELDS, artist_genre, 'artist_id')
+
+
+@bp.route('/artists/<int:artist_id>')
+def artist(artist_id):
+    return entity_detail(Artist, ARTIST_FIELDS, artist_genre, 'artist_id', artist_id)
+
+
+@bp.route('/venues')
+def venues():
+    return entity_list(Venue, VENUE_FIELDS, venue_genre, 'venue_id')
+
+
+@bp.route('/venues/<int:venue_id>')
+def venue(venue_id):
+    return entity_detail(Venue, VENUE_FIELDS, venue_genre, 'venue_id', venue_id)
+
+
+#----------------------------------------------------------------------------#
+# Venues near a point.
+#----------------------------------------------------------------------------#
+
+def search_area():
+    # -> (latitude, longitude, radius km or None, box or None) from
+    # ?lat=&lng=&radius_km= and/or ?bbox=min_lat,min_lng,max_lat,max_lng; a
+    # box crossing the antimeridian has min_lng > max_lng
+    max_radius = current_app.config['GEO_MAX_RADIUS_KM']
+    box = request.args.get('bbox')
+    if box is not None:
+        try:
+            box = tuple(float(i) for i in box.split(','))
+        except ValueError:
+            box = ()
+        if len(box) != 4 or not (-90 <= box[0] <= box[2] <= 90 and -180 <= box[1] <= 180 and -180 <= box[3] <= 180):
+            api_error(400, 'bbox must be min_lat,min_lng,max_lat,max_lng.')
+        if distance_km(*box) > 2 * max_radius:
+            api_error(400, 'bbox may be at most {} km across.'.format(2 * max_radius))
+
+    latitude = request.args.get('lat', type=float)
+    longitude = request.args.get('lng', type=float)
+    if latitude is None or longitude is None:
+        if box is None:
+            api_error(400, 'lat and lng are required without a bbox.')
+        latitude, longitude = box_center(box)
+    elif not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        api_error(400, 'lat must be within -90..90 and lng within -180..180.')
+
+    radius = request.args.get('radius_km', type=float)
+    if radius is None and box is None:
+        api_error(400, 'radius_km or bbox is required.')
+    if radius is not None and not 0 < radius <= max_radius:
+        api_error(400, 'radius_km must be above 0 and at most {}.'.format(max_radius))
+    return latitude, longitude, radius, box
+
+
+def upcoming_by_venue(venue_ids, now, limit):
+    # {venue id: [its first `limit` upcoming shows]}, in one query
+    rank = func.row_number().over(partition_by=Show.venue_id, order_by=(Show.start_time, Show.id)).label('rank')
+    ranked = session.query(
+        Show.id.label('show_id'),
+        Show.venue_id,
+        Show.artist_id,
+        Show.start_time,
+        Show.end_time,
+        Show.version.label('show_version'),
+        rank,
+    ).filter(Show.venue_id.in_(venue_ids), Show.start_time > now).subquery()
+    rows = session.query(
+        ranked,
+        Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link'),
+        Artist.version.label('artist_version'),
+    ).join(Artist, Artist.id == ranked.c.artist_id).filter(ranked.c.rank <= limit).order_by(ranked.c.start_time, ranked.c.show_id)
+
+    shows = {}
+    for row in rows:
+        shows.setdefault(row.venue_id, []).append(row)
+    return shows
+
+
+def near_data(found, shows):
+    return [{
+        'id': row.id,
+        'name': row.name,
+        'city': row.city,
+        'state': row.state,
+        'address': row.address,
+        'image_link': row.image_link,
+        'latitude': row.latitude,
+        'longitude': row.longitude,
+        'distance_km': round(distance, 3),
+        'upcoming_shows': [{
+            'id': i.show_id,
+            'artist_id': i.artist_id,
+            'artist_name': i.artist_name,
+            'artist_image_link': i.artist_image_link,
+            'start_time': i.start_time.isoformat(),
+            'end_time': i.end_time.isoformat(),
+        } for i in shows.get(row.id, [])],
+    } for distance, row in found]
+
+
+@bp.route('/venues/near')
+def venues_near():
+    # the `limit` nearest venues inside the radius and/or box, each with its
+    # upcoming shows
+    latitude, longitude, radius, box = search_area()
+    limit = page_limit()
+    rows = session.query(
+        Venue.id, Venue.version, Venue.name, Venue.city, Venue.state, Venue.address,
+        Venue.image_link, Venue.latitude, Venue.longitude,
+    ).filter(cell_filter(box_around(latitude, longitude, radius) if radius is not None else box)).all()
+    found = nearest(rows, latitude, longitude, radius, box, limit)
+
+    shows = {}
+    if found:
+        shows = upcoming_by_venue([row.id for _, row in found], datetime.now(), current_app.config['DETAIL_SHOWS_LIMIT'])
+    versions = [(row.id, row.version, [(i.show_id, i.show_version, i.artist_version) for i in shows.get(row.id, [])])
+                for _, row in found]
+
+    return conditional_response(versions, lambda: {'data': near_data(found, shows)})
+
+
+#----------------------------------------------------------------------------#
+# Shows.
+#----------------------------------------------------------------------------#
+
+def api_shows_query():
+    # the /shows query, plus the versions of the three rows behind each show
+    return shows_query().add_columns(
+        Show.version.label('show_version'),
+        Artist.version.label('artist_version'),
+        Venue.version.label('venue_version'),
+    )
+
+
+def show_versions(rows):
+    return [(i.show_id, i.show_version, i.artist_version, i.venue_version) for i in rows]
+
+
+def show_data(rows, fields):
+    data = []
+    for row in rows:
+        values = {
+            'id': row.show_id,
+            'venue_id': row[0],
+            'venue_name': row[1],
+            'artist_id': row[2],
+            'artist_name': row[3],
+            'artist_image_link': row[4],
+            'start_time': row.start_time.isoformat(),
+            'end_time': row.end_time.isoformat(),
+        }
+        data.append({i: values[i] for i in fields})
+    return data
+
+
+@bp.route('/shows')
+def shows():
+    fields = requested_fields(SHOW_FIELDS)
+    limit = page_limit()
+    query = api_shows_query()
+    if request.args.get('artist_id') is not None:
+        query = query.filter(Show.artist_id == request.args.get('artist_id', type=int))
+    if request.args.get('venue_id') is not None:
+        query = query.filter(Show.venue_id == request.args.get('venue_id', type=int))
+
+    after = request.args.get('after')
+    if after is not None:
+        after = decode_cursor(after)
+    rows, next_cursor = shows_page(after, limit, query)
+
+    return conditional_response(
+        show_versions(rows),
+        lambda: {'data': show_data(rows, fields), 'next_cursor': next_cursor},
+    )
+
+
+@bp.route('/shows/<int:show_id>')
+def show(show_id):
+    fields = requested_fields(SHOW_FIELDS)
+    row = api_shows_query().filter(Show.id == show_id).first()
+    if row is None:
+        api_error(404, 'Not found.')
+
+    return conditional_response(
+        show_versions([row]),
+        lambda: {'data': show_data([row], fields)[0]},
+    )
@@ -1,88 +1,136 @@
 from datetime import datetime
 from flask import (
-    Blueprint, flash, redirect, render_template, request, url_for, jsonify
+    Blueprint, current_app, flash, redirect, render_template, request, url_for, jsonify
 )
-from sqlalchemy import func
 from werkzeug.exceptions import abort
 
 from db import session
 from forms import *
 from models.artist import Artist
+from models.genre import Genre, artist_genre, genres_by_name
 from models.show import Show
 from models.venue import Venue
+from services.show import (
+    decode_cursor, past_shows_page, stats_counts, upcoming_shows, with_upcoming_count
+)
+from cache import cache
+from idempotency import create_once, new_key, request_key
+from loading import load_options
+from replicas import primary
+from search import search, search_page
 
 bp = Blueprint('artist', __name__)
 
 
-@bp.route('/artists')
-def artists():
+def artist_list(query_filter=None):
     data = []
-    artists = session.query(Artist.id, Artist.name).all()
+    query = session.query(Artist.id, Artist.name)
+    if query_filter is not None:
+        query = query_filter(query)
+    artists = query.order_by(Artist.id).all()
     for i in artists:
         data.append({
                 'id': i[0],
                 'name': i[1],
         })
 
+    return data
+
+
+@bp.route('/artists')
+@cache.cached('artists')
+def artists():
+    return render_template('pages/artists.html', artists=artist_list())
+
+
+@bp.route('/artists/genres/<genre>')
+@cache.cached('artists')
+def artists_by_genre(genre):
+    # answered from the (genre_id, artist_id) index on artist_genre
+    data = artist_list(lambda query: query.join(
+        artist_genre, artist_genre.c.artist_id == Artist.id,
+    ).join(Genre).filter(Genre.name == genre))
+
     return render_template('pages/artists.html', artists=data)
 
 
+def search_artists_query(search_term, limit=None, offset=None):
+    # case-insensitive search, each match paired with its upcoming show count
+    name_filter = search.name_filter(Artist, search_term)
+    query = with_upcoming_count(
+        session.query(Artist.id, Artist.name),
+        'artist', Artist.id, Show.artist_id, datetime.now(),
+    )
+    rows = query.filter(name_filter).order_by(Artist.id).limit(limit).offset(offset).all()
+
+    if not offset and (limit is None or len(rows) < limit):
+        count = len(rows)
+    else:
+        count = session.query(Artist.id).filter(name_filter).count()
+
+    return count, rows
+
+
 @bp.route('/artists/search', methods=['POST'])
 def search_artists():
-    # case-insensitive search
-    artists = session.query(Artist).filter(Artist.name.ilike('%{}%'.format(request.form['search_term']))).all()
+    limit, offset = search_page()
+    count, rows = search_artists_query(request.form['search_term'], limit, offset)
     data = []
-    for i in artists:
-        num_upcoming_shows = session.query(Show.id).filter(
-            Show.artist_id == i.id,
-            Show.start_time > func.now(),
-        ).count()
-
+    for i in rows:
         data.append({
-            'id': i.id,
-            'name': i.name,
-            'num_upcoming_shows': num_upcoming_shows,
+            'id': i[0],
+            'name': i[1],
+            'num_upcoming_shows': i[2],
         })
 
     response = {
-        'count': len(artists),
+        'count': count,
         'data': data,
     }
 
     return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
 
 
-@bp.route('/artists/<int:artist_id>')
-def show_artist(artist_id):
-    artist_data = Artist.query.get(artist_id)
-
-    past_shows = []
-    upcoming_shows = []
-    shows = session.query(
+def artist_shows_query(artist_id):
+    return session.query(
         Venue.id,
         Venue.name,
         Venue.image_link,
         Show.start_time,
-    ).join(Venue).filter(Show.artist_id==artist_id).all()
-
-    for i in shows:
-        show_info = {
-            'venue_id': i[0],
-            'venue_name': i[1],
-            'venue_image_link': i[2],
-            'start_time': str(i[3]),
-        }
-
-        if i[3] > datetime.now():
-            upcoming_shows.append(show_info)
-        else:
-            past_shows.append(show_info)
-    
+        Show.id.label('show_id'),
+    ).join(Venue).filter(Show.artist_id==artist_id)
+
+
+def artist_show_info(row):
+    return {
+        'venue_id': row[0],
+        'venue_name': row[1],
+        'venue_image_link': row[2],
+        'start_time': row[3],
+    }
+
+
+@bp.route('/artists/<int:artist_id>')
+@cache.cached('artist:{artist_id}')
+def show_artist(artist_id):
+    artist_data = Artist.query.options(*load_options(Artist, 'detail')).get(artist_id)
+
+    now = datetime.now()
+    limit = current_app.config['DETAIL_SHOWS_LIMIT']
+    upcoming_shows_count, past_shows_count = stats_counts('artist', artist_id, Show.artist_id==artist_id, now)
+    upcoming_rows = upcoming_shows(artist_shows_query(artist_id), now, limit)
+    past_rows, past_shows_next = past_shows_page(artist_shows_query(artist_id), now, limit=limit)
+
+    if upcoming_rows:
+        cache.expires(upcoming_rows[0][3])
+    upcoming_shows_data = [artist_show_info(i) for i in upcoming_rows]
+    past_shows_data = [artist_show_info(i) for i in past_rows]
+    cache.tag(*('venue:{}'.format(i[0]) for i in upcoming_rows + past_rows))
+
     artist = {
         "id": artist_id,
         "name": artist_data.name,
-        # '{Classical,Hip-Hop,R&B}' -> ['Classical', 'Hip-Hop', 'R&B']
-        "genres": artist_data.genres.strip('{}').split(','),
+        "genres": [i.name for i in artist_data.genres],
         "city": artist_data.city,
         "state": artist_data.state,
         "phone": artist_data.phone,
@@ -91,26 +139,48 @@ def show_artist(artist_id):
         "seeking_venue": artist_data.seeking_venue,
         "seeking_description": artist_data.seeking_description,
         "image_link": artist_data.image_link,
-        "past_shows": past_shows,
-        "upcoming_shows": upcoming_shows,
-        "past_shows_count": len(past_shows),
-        "upcoming_shows_count": len(upcoming_shows),
+        "past_shows": past_shows_data,
+        "upcoming_shows": upcoming_shows_data,
+        "past_shows_count": past_shows_count,
+        "upcoming_shows_count": upcoming_shows_count,
+        "past_shows_next": past_shows_next,
     }
 
     return render_template('pages/show_artist.html', artist=artist)
 
 
+@bp.route('/artists/<int:artist_id>/past_shows')
+def artist_past_shows(artist_id):
+    before = request.args.get('before')
+    if before is not None:
+        before = decode_cursor(before)
+    rows, next_cursor = past_shows_page(
+        artist_shows_query(artist_id),
+        datetime.now(),
+        before,
+        current_app.config['DETAIL_SHOWS_LIMIT'],
+    )
+    shows = [artist_show_info(i) for i in rows]
+
+    return jsonify({
+        'html': render_template('partials/artist_show_tiles.html', shows=shows),
+        'next_cursor': next_cursor,
+    })
+
+
 @bp.route('/artists/<int:artist_id>/edit', methods=['GET'])
+@primary
 def edit_artist(artist_id):
     form = ArtistForm()
-    artist = Artist.query.get(artist_id).__dict__
+    artist_data = Artist.query.options(*load_options(Artist, 'edit')).get(artist_id)
+    artist = artist_data.__dict__
 
     form.name.data = artist['name']
     form.city.data = artist['city']
     form.state.data = artist['state']
     form.phone.data = artist['phone']
     form.image_link.data = artist['image_link']
-    form.genres.data = artist['genres']
+    form.genres.data = [i.name for i in artist_data.genres]
     form.facebook_link.data = artist['facebook_link']
     form.website_link.data = artist['website_link']
     form.seeking_venue.data = artist['seeking_venue']
@@ -124,23 +194,18 @@ def edit_artist_submission(artist_id):
     form = ArtistForm(request.form)
     if form.validate():
         try:
-            artist = Artist.query.get(artist_id)
-
-            artist.name = request.form['name']
-            artist.city = request.form['city']
-            artist.state = request.form['state']
-            artist.phone = request.form['phone']
-            artist.image_link = request.form['image_link']
-            artist.genres = request.form.getlist('genres', type=str)
-            artist.facebook_link = request.form['facebook_link']
-            artist.website_link = request.form['website_link']
-            artist.seeking_venue = "seeking_venue" in request.form
-            artist.seeking_description = request.form['seeking_description']
-
-            if ArtistForm(request.form).validate():
-                print('YYYYY', flush=True)
-            else:
-                print('NNNNN', flush=True)
+            artist = Artist.query.options(*load_options(Artist, 'edit')).get(artist_id)
+
+            artist.name = form.name.data
+            artist.city = form.city.data
+            artist.state = form.state.data
+            artist.phone = form.phone.data
+            artist.image_link = form.image_link.data
+            artist.genres = genres_by_name(form.genres.data)
+            artist.facebook_link = form.facebook_link.data
+            artist.website_link = form.website_link.data
+            artist.seeking_venue = form.seeking_venue.data
+            artist.seeking_description = form.seeking_description.data
 
             session.commit()
             flash('Artist ' + request.form['name'] + ' was successfully edited!')
@@ -163,10 +228,33 @@ def edit_artist_submission(artist_id):
         return redirect(request.referrer)
         
 
+def create_artist(form, key=None):
+    # returns the new artist's id, or the one created earlier under `key`
+    def create():
+        new_artist = Artist(
+            name = form.name.data,
+            city = form.city.data,
+            state = form.state.data,
+            phone = form.phone.data,
+            genres = genres_by_name(form.genres.data),
+            facebook_link = form.facebook_link.data,
+            image_link = form.image_link.data,
+            website_link = form.website_link.data,
+            seeking_venue = form.seeking_venue.data,
+            seeking_description = form.seeking_description.data
+        )
+        session.add(new_artist)
+        # the id comes back with the INSERT, no query for it afterwards
+        session.flush()
+        return new_artist.id
+
+    return create_once('artist', key, create)
+
+
 @bp.route('/artists/create', methods=['GET'])
 def create_artist_form():
     form = ArtistForm()
-    return render_template('forms/new_artist.html', form=form)
+    return render_template('forms/new_artist.html', form=form, idempotency_key=new_key())
 
 
 @bp.route('/artists/create', methods=['POST'])
@@ -174,23 +262,9 @@ def create_artist_submission():
     form = ArtistForm(request.form)
     if form.validate():
         try:
-            new_artist = Artist(
-                name = request.form['name'],
-                city = request.form['city'],
-                state = request.form['state'],
-                phone = request.form['phone'],
-                genres = request.form.getlist('genres', type=str),
-                facebook_link = request.form['facebook_link'],
-                image_link = request.form['image_link'],
-                website_link = request.form['website_link'],
-                seeking_venue = "seeking_venue" in request.form,
-                seeking_description = request.form['seeking_description']
-            )
-
-            session.add(new_artist)
-            session.commit()
+            artist_id = create_artist(form, request_key())
             flash('Artist ' + request.form['name'] + ' was successfully listed!')
-            return redirect(url_for('show_artist', artist_id=Artist.query.order_by(Artist.id.desc()).first().id))
+            return redirect(url_for('artist.show_artist', artist_id=artist_id))
             
         except Exception as e:
             session.rollback()
@@ -1,46 +1,206 @@
+from datetime import datetime
 from flask import (
-    Blueprint, flash, g, redirect, render_template, request, url_for
+    Blueprint, Response, current_app, flash, g, get_flashed_messages, redirect,
+    render_template, request, stream_with_context, url_for
 )
+from sqlalchemy import and_, case, func, or_, tuple_
+from sqlalchemy.exc import IntegrityError
 from werkzeug.exceptions import abort
 
 from db import session
 from forms import *
 from models.artist import Artist
 from models.show import Show
+from models.show_stats import ShowStats
 from models.venue import Venue
+from cache import cache
+from idempotency import create_once, new_key, request_key
+from scheduling import ScheduleError, ShowConflict, check_booking, is_conflict, show_end
 
 bp = Blueprint('show', __name__)
 
 
-@bp.route('/shows')
-def shows():
-    shows = session.query(
+def shows_query():
+    return session.query(
         Venue.id,
         Venue.name,
         Artist.id,
         Artist.name,
         Artist.image_link,
-        Show.start_time
-    ).join(Artist).join(Venue).all()
+        Show.start_time,
+        Show.id.label('show_id'),
+        Show.end_time,
+    ).join(Artist).join(Venue).order_by(Show.start_time, Show.id)
+
+
+def shows_page(after=None, limit=None, query=None):
+    # keyset pagination on (start_time, id): each page is an index range
+    # scan that starts where the previous page ended, however deep it is
+    if query is None:
+        query = shows_query()
+    if after is not None:
+        query = query.filter(tuple_(Show.start_time, Show.id) > after)
+    rows = query.limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].start_time, rows[-1].show_id)
+
+    return rows, next_cursor
+
+
+def encode_cursor(start_time, show_id):
+    # e.g. (datetime(2023, 4, 12, 21, 0), 42) -> '2023-04-12T21:00:00_42'
+    return '{}_{}'.format(start_time.isoformat(), show_id)
+
+
+def decode_cursor(cursor):
+    try:
+        start_time, show_id = cursor.rsplit('_', 1)
+        return datetime.fromisoformat(start_time), int(show_id)
+    except ValueError:
+        abort(400)
+
+
+def show_counts(criterion, now):
+    # (upcoming, past) counts for the shows matching `criterion`, in one query
+    return session.query(
+        func.count(case((Show.start_time > now, Show.id))),
+        func.count(case((Show.start_time <= now, Show.id))),
+    ).filter(criterion).one()
+
+
+def stats_counts(kind, entity_id, criterion, now):
+    # (upcoming, past) counts from show_stats, or counted from the show table
+    # when the row is missing or stale (its next show has started since)
+    row = session.query(
+        ShowStats.upcoming_count,
+        ShowStats.past_count,
+        ShowStats.next_show_time,
+    ).filter(ShowStats.kind == kind, ShowStats.entity_id == entity_id).first()
+    if row is None or (row.next_show_time is not None and row.next_show_time <= now):
+        return show_counts(criterion, now)
+    return row.upcoming_count, row.past_count
+
+
+def with_upcoming_count(query, kind, entity_id, show_column, now):
+    # adds each row's upcoming show count, read from show_stats and only
+    # counted live for rows that are missing or stale there
+    live = session.query(func.count(Show.id)).filter(
+        show_column == entity_id,
+        Show.start_time > now,
+    ).scalar_subquery()
+    return query.outerjoin(ShowStats, and_(
+        ShowStats.kind == kind,
+        ShowStats.entity_id == entity_id,
+    )).add_columns(case(
+        (or_(ShowStats.entity_id == None, ShowStats.next_show_time <= now), live),
+        else_=ShowStats.upcoming_count,
+    ))
+
+
+def upcoming_shows(query, now, limit):
+    return query.filter(Show.start_time > now).order_by(Show.start_time, Show.id).limit(limit).all()
+
+
+def next_show_time(now):
+    # when the first show after `now` starts, from the start_time index;
+    # pages counting upcoming shows are stale from then on
+    return session.query(func.min(Show.start_time)).filter(Show.start_time > now).scalar()
 
-    data = []
-    for i in shows:
-        data.append({
-            'venue_id': i[0],
-            'venue_name': i[1],
-            'artist_id': i[2],
-            'artist_name': i[3],
-            'artist_image_link': i[4],
-            'start_time': i[5].strftime('%Y-%m-%dT%H:%M:%S.%fZ')
-        })
 
-    return render_template('pages/shows.html', shows=data)
+def past_shows_page(query, now, before=None, limit=None):
+    # most recent first, continuing below the `before` (start_time, id) cursor
+    query = query.filter(Show.start_time <= now)
+    if before is not None:
+        query = query.filter(tuple_(Show.start_time, Show.id) < before)
+    rows = query.order_by(Show.start_time.desc(), Show.id.desc()).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].start_time, rows[-1].show_id)
+
+    return rows, next_cursor
+
+
+def show_info(row):
+    return {
+        'venue_id': row[0],
+        'venue_name': row[1],
+        'artist_id': row[2],
+        'artist_name': row[3],
+        'artist_image_link': row[4],
+        'start_time': row[5],
+    }
+
+
+def stream_template(template_name, **context):
+    # render the template chunk by chunk while the response is being sent
+    app = current_app._get_current_object()
+    app.update_template_context(context)
+    template = app.jinja_env.get_template(template_name)
+    return Response(stream_with_context(template.generate(context)))
+
+
+@bp.route('/shows')
+@cache.cached('shows')
+def shows():
+    if request.args.get('stream', type=int):
+        # flashed messages must leave the cookie before the headers are sent
+        get_flashed_messages()
+        page_size = current_app.config['SHOWS_PAGE_SIZE']
+        data = (show_info(i) for i in shows_query().yield_per(page_size))
+        return stream_template('pages/shows.html', shows=data, next_cursor=None)
+
+    after = request.args.get('after')
+    if after is not None:
+        after = decode_cursor(after)
+    limit = min(
+        request.args.get('per_page', current_app.config['SHOWS_PAGE_SIZE'], type=int),
+        current_app.config['SHOWS_MAX_PAGE_SIZE'],
+    )
+    if limit < 1:
+        abort(400)
+
+    rows, next_cursor = shows_page(after, limit)
+    data = [show_info(i) for i in rows]
+
+    return render_template('pages/shows.html', shows=data, next_cursor=next_cursor)
+
+
+def create_show(form, key=None):
+    # returns the new show's id, or the one created earlier under `key`;
+    # raises ScheduleError for bad times and ShowConflict for a double booking
+    start_time = form.start_time.data
+    end_time = show_end(start_time, form.end_time.data)
+
+    def create():
+        check_booking(form.artist_id.data, form.venue_id.data, start_time, end_time)
+        new_show = Show(
+            artist_id = form.artist_id.data,
+            venue_id = form.venue_id.data,
+            start_time = start_time,
+            end_time = end_time,
+        )
+        session.add(new_show)
+        session.flush()
+        return new_show.id
+
+    try:
+        return create_once('show', key, create)
+    except IntegrityError as e:
+        # PostgreSQL: a concurrent booking got past the check first
+        if is_conflict(e):
+            raise ShowConflict('The venue or the artist was booked for that time in the meantime.') from e
+        raise
 
 
 @bp.route('/shows/create')
 def create_shows():
     form = ShowForm()
-    return render_template('forms/new_show.html', form=form)
+    return render_template('forms/new_show.html', form=form, idempotency_key=new_key())
 
 
 @bp.route('/shows/create', methods=['POST'])
@@ -48,17 +208,15 @@ def create_show_submission():
     form = ShowForm(request.form)
     if form.validate():
         try:
-            new_show = Show(
-                artist_id = request.form['artist_id'],
-                venue_id = request.form['venue_id'],
-                start_time = request.form['start_time'],
-            )
-
-            session.add(new_show)
-            session.commit()
+            create_show(form, request_key())
             flash('Show was successfully listed!')
             return redirect(url_for('shows'))
-            
+
+        except ScheduleError as e:
+            session.rollback()
+            flash(str(e), 'warning')
+            return redirect(request.referrer)
+
         except Exception as e:
             session.rollback()
             flash('An error occurred. Show could not be listed.', 'error')
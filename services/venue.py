@@ -1,36 +1,50 @@
 from datetime import datetime
+from itertools import groupby
 from flask import (
-    Blueprint, flash, g, redirect, render_template, request, url_for, jsonify
+    Blueprint, current_app, flash, g, redirect, render_template, request, url_for, jsonify
 )
-from sqlalchemy import func
 from werkzeug.exceptions import abort
 
 from db import session
 from forms import *
 from models.artist import Artist
+from models.genre import Genre, genres_by_name, venue_genre
 from models.show import Show
 from models.venue import Venue
+from services.show import (
+    decode_cursor, next_show_time, past_shows_page, stats_counts, upcoming_shows, with_upcoming_count
+)
+from cache import cache
+from idempotency import create_once, new_key, request_key
+from loading import load_options
+from replicas import primary
+from search import search, search_page
 
 bp = Blueprint('venue', __name__)
 
 
-@bp.route('/venues')
-def venues():
+def venue_areas(query_filter=None):
+    # one round-trip: every venue with its upcoming show count, ordered so
+    # that venues in the same area are adjacent and can be grouped here
+    now = datetime.now()
+    query = with_upcoming_count(
+        session.query(Venue.city, Venue.state, Venue.id, Venue.name),
+        'venue', Venue.id, Show.venue_id, now,
+    )
+    cache.expires(next_show_time(now))
+    if query_filter is not None:
+        query = query_filter(query)
+    rows = query.order_by(Venue.city, Venue.state, Venue.id).all()
+
     data = []
-    locations_unique = session.query(Venue.city, Venue.state).distinct(Venue.city, Venue.state).all()
-    for i in locations_unique:
-        city = i[0]
-        state = i[1]
+    for (city, state), area_rows in groupby(rows, key=lambda i: (i[0], i[1])):
         venues = []
-
-        venues_data = session.query(Venue).filter(Venue.city==city, Venue.state==state).all()
-        for j in venues_data:
-            venue = {
-                'id': j.id,
-                'name': j.name,
-                'num_upcoming_shows': 0,
-            }
-            venues.append(venue)
+        for j in area_rows:
+            venues.append({
+                'id': j[2],
+                'name': j[3],
+                'num_upcoming_shows': j[4],
+            })
 
         data.append({
                 'city': city,
@@ -38,65 +52,103 @@ def venues():
                 'venues': venues,
         })
 
-    return render_template('pages/venues.html', areas=data);
+    return data
+
+
+@bp.route('/venues')
+@cache.cached('venues')
+def venues():
+    return render_template('pages/venues.html', areas=venue_areas());
+
+
+@bp.route('/venues/genres/<genre>')
+@cache.cached('venues')
+def venues_by_genre(genre):
+    # answered from the (genre_id, venue_id) index on venue_genre
+    data = venue_areas(lambda query: query.join(
+        venue_genre, venue_genre.c.venue_id == Venue.id,
+    ).join(Genre).filter(Genre.name == genre))
+
+    return render_template('pages/venues.html', areas=data)
+
+
+def search_venues_query(search_term, limit=None, offset=None):
+    # case-insensitive search, each match paired with its upcoming show count
+    name_filter = search.name_filter(Venue, search_term)
+    query = with_upcoming_count(
+        session.query(Venue.id, Venue.name),
+        'venue', Venue.id, Show.venue_id, datetime.now(),
+    )
+    rows = query.filter(name_filter).order_by(Venue.id).limit(limit).offset(offset).all()
+
+    if not offset and (limit is None or len(rows) < limit):
+        count = len(rows)
+    else:
+        count = session.query(Venue.id).filter(name_filter).count()
+
+    return count, rows
 
 
 @bp.route('/venues/search', methods=['POST'])
 def search_venues():
-    # case-insensitive search
-    venues = session.query(Venue).filter(Venue.name.ilike('%{}%'.format(request.form['search_term']))).all()
+    limit, offset = search_page()
+    count, rows = search_venues_query(request.form['search_term'], limit, offset)
     data = []
-    for i in venues:
-        num_upcoming_shows = session.query(Show.id).filter(
-            Show.venue_id == i.id,
-            Show.start_time > func.now(),
-        ).count()
-
+    for i in rows:
         data.append({
-            'id': i.id,
-            'name': i.name,
-            'num_upcoming_shows': num_upcoming_shows,
+            'id': i[0],
+            'name': i[1],
+            'num_upcoming_shows': i[2],
         })
 
     response = {
-        'count': len(venues),
+        'count': count,
         'data': data,
     }
 
     return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
 
 
-@bp.route('/venues/<int:venue_id>')
-def show_venue(venue_id):
-    venue_data = Venue.query.get(venue_id)
-
-    past_shows = []
-    upcoming_shows = []
-    shows = session.query(
+def venue_shows_query(venue_id):
+    return session.query(
         Artist.id,
         Artist.name,
         Artist.image_link,
         Show.start_time,
-    ).join(Artist).filter(Show.venue_id==venue_id).all()
-
-    for i in shows:
-        show_info = {
-            'artist_id': i[0],
-            'artist_name': i[1],
-            'artist_image_link': i[2],
-            'start_time': str(i[3]),
-        }
-
-        if i[3] > datetime.now():
-            upcoming_shows.append(show_info)
-        else:
-            past_shows.append(show_info)
-    
+        Show.id.label('show_id'),
+    ).join(Artist).filter(Show.venue_id==venue_id)
+
+
+def venue_show_info(row):
+    return {
+        'artist_id': row[0],
+        'artist_name': row[1],
+        'artist_image_link': row[2],
+        'start_time': row[3],
+    }
+
+
+@bp.route('/venues/<int:venue_id>')
+@cache.cached('venue:{venue_id}')
+def show_venue(venue_id):
+    venue_data = Venue.query.options(*load_options(Venue, 'detail')).get(venue_id)
+
+    now = datetime.now()
+    limit = current_app.config['DETAIL_SHOWS_LIMIT']
+    upcoming_shows_count, past_shows_count = stats_counts('venue', venue_id, Show.venue_id==venue_id, now)
+    upcoming_rows = upcoming_shows(venue_shows_query(venue_id), now, limit)
+    past_rows, past_shows_next = past_shows_page(venue_shows_query(venue_id), now, limit=limit)
+
+    if upcoming_rows:
+        cache.expires(upcoming_rows[0][3])
+    upcoming_shows_data = [venue_show_info(i) for i in upcoming_rows]
+    past_shows_data = [venue_show_info(i) for i in past_rows]
+    cache.tag(*('artist:{}'.format(i[0]) for i in upcoming_rows + past_rows))
+
     venue = {
         "id": venue_id,
         "name": venue_data.name,
-        # e.g. '{Classical,Hip-Hop,R&B}' -> ['Classical', 'Hip-Hop', 'R&B']
-        "genres": venue_data.genres.strip('{}').split(','),
+        "genres": [i.name for i in venue_data.genres],
         "address": venue_data.address,
         "city": venue_data.city,
         "state": venue_data.state,
@@ -106,19 +158,63 @@ def show_venue(venue_id):
         "seeking_talent": venue_data.seeking_talent,
         "seeking_description": venue_data.seeking_description,
         "image_link": venue_data.image_link,
-        "past_shows": past_shows,
-        "upcoming_shows": upcoming_shows,
-        "past_shows_count": len(past_shows),
-        "upcoming_shows_count": len(upcoming_shows),
+        "past_shows": past_shows_data,
+        "upcoming_shows": upcoming_shows_data,
+        "past_shows_count": past_shows_count,
+        "upcoming_shows_count": upcoming_shows_count,
+        "past_shows_next": past_shows_next,
     }
 
     return render_template('pages/show_venue.html', venue=venue)
 
 
+@bp.route('/venues/<int:venue_id>/past_shows')
+def venue_past_shows(venue_id):
+    before = request.args.get('before')
+    if before is not None:
+        before = decode_cursor(before)
+    rows, next_cursor = past_shows_page(
+        venue_shows_query(venue_id),
+        datetime.now(),
+        before,
+        current_app.config['DETAIL_SHOWS_LIMIT'],
+    )
+    shows = [venue_show_info(i) for i in rows]
+
+    return jsonify({
+        'html': render_template('partials/venue_show_tiles.html', shows=shows),
+        'next_cursor': next_cursor,
+    })
+
+
+def create_venue(form, key=None):
+    # returns the new venue's id, or the one created earlier under `key`
+    def create():
+        new_venue = Venue(
+            name = form.name.data,
+            city = form.city.data,
+            state = form.state.data,
+            address = form.address.data,
+            phone = form.phone.data,
+            image_link = form.image_link.data,
+            genres = genres_by_name(form.genres.data),
+            facebook_link = form.facebook_link.data,
+            website_link = form.website_link.data,
+            seeking_talent = form.seeking_talent.data,
+            seeking_description = form.seeking_description.data
+        )
+        session.add(new_venue)
+        # the id comes back with the INSERT, no query for it afterwards
+        session.flush()
+        return new_venue.id
+
+    return create_once('venue', key, create)
+
+
 @bp.route('/venues/create', methods=['GET'])
 def create_venue_form():
     form = VenueForm()
-    return render_template('forms/new_venue.html', form=form)
+    return render_template('forms/new_venue.html', form=form, idempotency_key=new_key())
 
 
 @bp.route('/venues/create', methods=['POST'])
@@ -126,26 +222,11 @@ def create_venue_submission():
     form = VenueForm(request.form)
     if form.validate():
         try:
-            new_venue = Venue(
-                name = request.form['name'],
-                city = request.form['city'],
-                state = request.form['state'],
-                address = request.form['address'],
-                phone = request.form['phone'],
-                image_link = request.form['image_link'],
-                genres = request.form.getlist('genres', type=str),
-                facebook_link = request.form['facebook_link'],
-                website_link = request.form['website_link'],
-                seeking_talent = "seeking_talent" in request.form,
-                seeking_description = request.form['seeking_description']
-            )
-
-            session.add(new_venue)
-            session.commit()
+            venue_id = create_venue(form, request_key())
             # on successful db insert, flash success
             # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
             flash('Venue ' + request.form['name'] + ' was successfully listed!')
-            return redirect(url_for('show_venue', venue_id=Venue.query.order_by(Venue.id.desc()).first().id))
+            return redirect(url_for('venue.show_venue', venue_id=venue_id))
             
         except Exception as e:
             session.rollback()
@@ -185,16 +266,18 @@ def delete_venue(venue_id):
 
 
 @bp.route('/venues/<int:venue_id>/edit', methods=['GET'])
+@primary
 def edit_venue(venue_id):
     form = VenueForm()
-    venue = Venue.query.get(venue_id).__dict__
+    venue_data = Venue.query.options(*load_options(Venue, 'edit')).get(venue_id)
+    venue = venue_data.__dict__
 
     form.name.data = venue['name']
     form.city.data = venue['city']
     form.state.data = venue['state']
     form.phone.data = venue['phone']
     form.image_link.data = venue['image_link']
-    form.genres.data = venue['genres']
+    form.genres.data = [i.name for i in venue_data.genres]
     form.address.data = venue['address']
     form.facebook_link.data = venue['facebook_link']
     form.website_link.data = venue['website_link']
@@ -209,19 +292,19 @@ def edit_venue_submission(venue_id):
     form = VenueForm(request.form)
     if form.validate():
         try:
-            venue = Venue.query.get(venue_id)
-
-            venue.name = request.form['name']
-            venue.city = request.form['city']
-            venue.state = request.form['state']
-            venue.address = request.form['address']
-            venue.phone = request.form['phone']
-            venue.image_link = request.form['image_link']
-            venue.genres = request.form.getlist('genres', type=str)
-            venue.facebook_link = request.form['facebook_link']
-            venue.website_link = request.form['website_link']
-            venue.seeking_talent = "seeking_talent" in request.form
-            venue.seeking_description = request.form['seeking_description']
+            venue = Venue.query.options(*load_options(Venue, 'edit')).get(venue_id)
+
+            venue.name = form.name.data
+            venue.city = form.city.data
+            venue.state = form.state.data
+            venue.address = form.address.data
+            venue.phone = form.phone.data
+            venue.image_link = form.image_link.data
+            venue.genres = genres_by_name(form.genres.data)
+            venue.facebook_link = form.facebook_link.data
+            venue.website_link = form.website_link.data
+            venue.seeking_talent = form.seeking_talent.data
+            venue.seeking_description = form.seeking_description.data
 
             session.commit()
             flash('Venue ' + request.form['name'] + ' was successfully edited!')
@@ -0,0 +1,233 @@
+from datetime import datetime
+
+import click
+
+from flask.cli import with_appcontext
+from sqlalchemy import and_, case, event, func, select
+from sqlalchemy.orm import attributes
+
+from db import session
+from models.artist import Artist
+from models.show import Show
+from models.show_stats import ShowStats
+from models.venue import Venue
+
+#----------------------------------------------------------------------------#
+# Show statistics.
+#
+# show_stats holds the upcoming and past show counts and the next show time
+# of every artist and venue, so pages and search results read one row
+# instead of counting shows. A new show bumps its artist's and venue's
+# counters in the same transaction; other changes recount the rows they
+# touch. Counts are as of the last write or `flask show-stats roll`; rows
+# whose next show has started since are counted live by readers until the
+# roll-forward catches up.
+#----------------------------------------------------------------------------#
+
+KINDS = {
+    'artist': (Artist, Show.artist_id),
+    'venue': (Venue, Show.venue_id),
+}
+CHUNK_SIZE = 1000
+
+
+def kind_of(obj):
+    if isinstance(obj, Artist):
+        return 'artist'
+    if isinstance(obj, Venue):
+        return 'venue'
+    return None
+
+
+def recount(conn, kind, ids, now=None):
+    # rewrite the rows of `ids` from the show table
+    now = now or datetime.now()
+    ids = sorted(set(ids))
+    table = ShowStats.__table__
+    show_column = KINDS[kind][1]
+
+    for i in range(0, len(ids), CHUNK_SIZE):
+        chunk = ids[i:i + CHUNK_SIZE]
+        counts = {row[0]: row[1:] for row in conn.execute(select(
+            show_column,
+            func.count(case((Show.start_time > now, Show.id))),
+            func.count(case((Show.start_time <= now, Show.id))),
+            func.min(case((Show.start_time > now, Show.start_time))),
+        ).where(show_column.in_(chunk)).group_by(show_column))}
+
+        existing = {row[0] for row in conn.execute(select(table.c.entity_id).where(and_(
+            table.c.kind == kind, table.c.entity_id.in_(chunk))))}
+        new_rows = []
+        for id in chunk:
+            upcoming, past, next_show_time = counts.get(id, (0, 0, None))
+            values = {'upcoming_count': upcoming, 'past_count': past, 'next_show_time': next_show_time}
+            if id in existing:
+                conn.execute(table.update().where(and_(
+                    table.c.kind == kind, table.c.entity_id == id)).values(**values))
+            else:
+                new_rows.append(dict(values, kind=kind, entity_id=id))
+        if new_rows:
+            conn.execute(table.insert(), new_rows)
+
+
+def add_show(conn, kind, id, start_time, now):
+    # e.g. an upcoming show: upcoming_count + 1, and maybe an earlier
+    # next_show_time; returns False when there is no row to update
+    table = ShowStats.__table__
+    if start_time > now:
+        values = {
+            'upcoming_count': table.c.upcoming_count + 1,
+            'next_show_time': case(
+                (table.c.next_show_time == None, start_time),
+                (table.c.next_show_time > start_time, start_time),
+                else_=table.c.next_show_time,
+            ),
+        }
+    else:
+        values = {'past_count': table.c.past_count + 1}
+    result = conn.execute(table.update().where(and_(
+        table.c.kind == kind, table.c.entity_id == id)).values(**values))
+    return result.rowcount > 0
+
+
+def roll_forward(conn, now=None):
+    # recount the rows whose next show has started; returns how many
+    now = now or datetime.now()
+    table = ShowStats.__table__
+    stale = {kind: [] for kind in KINDS}
+    for kind, id in conn.execute(select(table.c.kind, table.c.entity_id).where(table.c.next_show_time <= now)):
+        stale[kind].append(id)
+    for kind, ids in stale.items():
+        recount(conn, kind, ids, now)
+    return sum(len(i) for i in stale.values())
+
+
+def rebuild(conn, now=None):
+    now = now or datetime.now()
+    table = ShowStats.__table__
+    for kind, (model, _) in KINDS.items():
+        ids = [i for (i,) in conn.execute(select(model.id))]
+        conn.execute(table.delete().where(and_(table.c.kind == kind, table.c.entity_id.notin_(
+            select(model.id).scalar_subquery()))))
+        recount(conn, kind, ids, now)
+
+
+#----------------------------------------------------------------------------#
+# Maintenance from session changes.
+#----------------------------------------------------------------------------#
+
+def _collect_changes(sess, flush_context, instances):
+    # before the flush, while deleted artists and venues still have shows
+    created, shows, recounts, deleted = [], [], set(), set()
+
+    for obj in sess.new:
+        if isinstance(obj, Show):
+            shows.append(obj)
+        elif kind_of(obj):
+            created.append(obj)
+
+    for obj in sess.dirty:
+        if not isinstance(obj, Show):
+            continue
+        moved = any(attributes.get_history(obj, i).has_changes() for i in ('artist_id', 'venue_id', 'start_time'))
+        if moved:
+            for key, kind in (('artist_id', 'artist'), ('venue_id', 'venue')):
+                history = attributes.get_history(obj, key)
+                recounts.update((kind, int(i)) for i in history.sum() if i is not None)
+
+    for obj in sess.deleted:
+        kind = kind_of(obj)
+        if isinstance(obj, Show):
+            recounts.update((('artist', int(obj.artist_id)), ('venue', int(obj.venue_id))))
+        elif kind:
+            deleted.add((kind, obj.id))
+            # the other side of every show about to go with it
+            other = 'venue' if kind == 'artist' else 'artist'
+            for (id,) in sess.connection().execute(
+                    select(KINDS[other][1]).distinct().where(KINDS[kind][1] == obj.id)):
+                recounts.add((other, id))
+
+    if created or shows or recounts or deleted:
+        sess.info['show_stats'] = (created, shows, recounts, deleted)
+
+
+def _apply_changes(sess, flush_context):
+    changes = sess.info.pop('show_stats', None)
+    if changes is None:
+        return
+
+    created, shows, recounts, deleted = changes
+    now = datetime.now()
+    conn = sess.connection()
+    for obj in created:
+        recounts.add((kind_of(obj), obj.id))
+
+    if shows:
+        # read back as stored, form values may still be strings here
+        for artist_id, venue_id, start_time in conn.execute(select(
+                Show.artist_id, Show.venue_id, Show.start_time).where(Show.id.in_([i.id for i in shows]))):
+            for kind, id in (('artist', artist_id), ('venue', venue_id)):
+                if (kind, id) not in recounts and not add_show(conn, kind, id, start_time, now):
+                    recounts.add((kind, id))
+
+    table = ShowStats.__table__
+    for kind, id in deleted:
+        recounts.discard((kind, id))
+        conn.execute(table.delete().where(and_(table.c.kind == kind, table.c.entity_id == id)))
+
+    for kind in KINDS:
+        recount(conn, kind, [id for k, id in recounts if k == kind], now)
+
+
+def _discard_changes(sess, transaction):
+    if transaction.parent is None:
+        sess.info.pop('show_stats', None)
+
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+@click.group('show-stats')
+def show_stats_cli():
+    """Maintain the show_stats summary."""
+
+
+@show_stats_cli.command('roll')
+@with_appcontext
+def roll_command():
+    """Recount artists and venues whose next show has started.
+
+    Run it periodically, e.g. every few minutes from cron.
+    """
+    count = roll_forward(session.connection())
+    session.commit()
+    click.echo('{} rows rolled forward.'.format(count))
+
+
+@show_stats_cli.command('rebuild')
+@with_appcontext
+def rebuild_command():
+    """Recount every artist and venue from the show table."""
+    rebuild(session.connection())
+    session.commit()
+    click.echo('show_stats rebuilt.')
+
+
+class ShowStatistics:
+    def __init__(self, app=None):
+        self._listening = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.cli.add_command(show_stats_cli)
+
+        if not self._listening:
+            event.listen(session, 'before_flush', _collect_changes)
+            event.listen(session, 'after_flush', _apply_changes)
+            event.listen(session, 'after_transaction_end', _discard_changes)
+            self._listening = True
+
+
+show_stats = ShowStatistics()
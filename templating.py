@@ -0,0 +1,95 @@
+import os
+import tempfile
+import time
+
+import click
+
+from flask import current_app
+from flask.cli import with_appcontext
+from jinja2 import FileSystemBytecodeCache
+
+#----------------------------------------------------------------------------#
+# Precompiled templates.
+#
+# Compiled templates are kept as Jinja bytecode in TEMPLATE_CACHE_DIR, keyed
+# by the checksum of their source, so an edited template is compiled again
+# rather than served stale. `flask templates compile` fills it at build time,
+# and each worker loads every template when it starts (TEMPLATE_PRELOAD, see
+# start_worker and gunicorn.conf.py), so no first request pays for parsing
+# and compiling the templates it renders. create_app itself touches no files.
+#----------------------------------------------------------------------------#
+
+TEMPLATE_EXTENSIONS = ('.html',)
+
+
+class AtomicBytecodeCache(FileSystemBytecodeCache):
+    # workers starting together may compile the same template; a reader must
+    # never see another worker's half-written file
+    def dump_bytecode(self, bucket):
+        try:
+            fd, path = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        except OSError:
+            # no directory (yet): the template is still compiled, just not kept
+            return
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                bucket.write_bytecode(f)
+            os.replace(path, self._get_cache_filename(bucket))
+        except BaseException:
+            os.remove(path)
+            raise
+
+
+def template_names(app):
+    # e.g. ['errors/404.html', ..., 'partials/venue_show_tiles.html']
+    return app.jinja_env.list_templates(filter_func=lambda i: i.endswith(TEMPLATE_EXTENSIONS))
+
+
+def load_templates(app):
+    # compiles (or loads the bytecode of) every template into the
+    # environment's cache; returns the seconds per template
+    timings = {}
+    for name in template_names(app):
+        start = time.perf_counter()
+        app.jinja_env.get_template(name)
+        timings[name] = time.perf_counter() - start
+    return timings
+
+
+@click.group('templates')
+def templates_cli():
+    """Precompile the Jinja templates."""
+
+
+@templates_cli.command('compile')
+@with_appcontext
+def compile_command():
+    """Compile every template into TEMPLATE_CACHE_DIR."""
+    if current_app.jinja_env.bytecode_cache is None:
+        raise click.ClickException('TEMPLATE_CACHE_DIR is not set.')
+    os.makedirs(current_app.config['TEMPLATE_CACHE_DIR'], exist_ok=True)
+    current_app.jinja_env.bytecode_cache.clear()
+    # compile from source, not from templates preloaded at startup
+    current_app.jinja_env.cache.clear()
+    timings = load_templates(current_app)
+    click.echo('{} templates compiled in {:.1f} ms into {}.'.format(
+        len(timings), sum(timings.values()) * 1000, current_app.config['TEMPLATE_CACHE_DIR']))
+
+
+def start_worker(app):
+    # once per serving process, before its first request, e.g. from
+    # gunicorn's post_worker_init; returns the seconds per template loaded
+    directory = app.config['TEMPLATE_CACHE_DIR']
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    if app.config['TEMPLATE_PRELOAD']:
+        return load_templates(app)
+    return {}
+
+
+def init_app(app):
+    app.cli.add_command(templates_cli)
+
+    directory = app.config['TEMPLATE_CACHE_DIR']
+    if directory:
+        app.jinja_env.bytecode_cache = AtomicBytecodeCache(directory)